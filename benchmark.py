@@ -0,0 +1,197 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from calculate_profits import analyze_loading_plans
+from plans import loading_array
+from methods import METHODS, get_method
+from scenario import synthetic_scenario
+
+# Methods benchmarked by default, with their parameters
+DEFAULT_METHODS = {
+    'naive': {},
+    'brute_force': {'vectorized': True},
+    'pulp_simplex': {},
+    'docplex_barrier': {},
+    'docplex_rounded': {},
+    'matrix_highs': {}
+}
+
+# The brute-force grid grows as (2 * rangee / step + 1) ** nodes, so larger instances are skipped
+MAX_NODES = {'brute_force': 4}
+
+@contextlib.contextmanager
+def silence_output():
+    """Silence stdout at the file descriptor level, including solver subprocesses"""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved, 1)
+            os.close(saved)
+
+def evaluate_plan(loading_plan, scenario):
+    """Feasibility, total wafer change and net profit ($M) of a plan under a scenario"""
+    if loading_plan is None:
+        return {'feasible': False, 'total_change': None, 'net_profit': None}
+
+    loadings = loading_array(loading_plan, scenario.nodes)
+    changes = np.abs(np.diff(loadings, axis=0))
+    output = (loadings * scenario.wafer_gb).sum(axis=1) / 1e9
+    feasible = (
+        len(loadings) == scenario.n_quarters
+        and bool((loadings >= 0).all())
+        and bool((changes <= scenario.max_change).all())
+        # Small tolerance for plans rounded from continuous solutions
+        and bool((np.abs(output - scenario.tam) <= scenario.tam_range + 1e-6).all())
+    )
+    return {
+        'feasible': feasible,
+        'total_change': int(changes.sum()),
+        'net_profit': float(analyze_loading_plans(loadings[None], scenario)['net_profit'][0])
+    }
+
+def benchmark_method(name, params, scenario, repeats):
+    """Time `repeats` runs of a method, then measure its peak Python memory in one more run"""
+    method = get_method(name)
+    times = []
+    loading_plan = None
+    try:
+        for _ in range(repeats):
+            with silence_output():
+                start = time.perf_counter()
+                loading_plan = method(scenario=scenario, **params)
+                times.append(time.perf_counter() - start)
+
+        # tracemalloc sees Python and NumPy allocations but not memory inside native solvers
+        tracemalloc.start()
+        with silence_output():
+            method(scenario=scenario, **params)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    except Exception as exc:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {'status': 'error', 'error': repr(exc)}
+
+    return {
+        'status': 'ok',
+        'time_min': min(times),
+        'time_median': statistics.median(times),
+        'times': times,
+        'peak_memory': peak_memory,
+        **evaluate_plan(loading_plan, scenario)
+    }
+
+def run_benchmark(quarters, nodes, volatilities, methods=DEFAULT_METHODS, repeats=3, seed=0):
+    """Benchmark every method on synthetic instances of every size; returns a JSON-serialisable dict"""
+    records = []
+    for n_quarters in quarters:
+        for n_nodes in nodes:
+            for volatility in volatilities:
+                scenario = synthetic_scenario(n_quarters, n_nodes, volatility, seed=seed)
+                instance = f"q{n_quarters}_n{n_nodes}_v{volatility}_s{seed}"
+                for name, params in methods.items():
+                    if n_nodes > MAX_NODES.get(name, n_nodes):
+                        result = {'status': 'skipped'}
+                    else:
+                        result = benchmark_method(name, params, scenario, repeats)
+                    records.append({
+                        'instance': instance,
+                        'quarters': n_quarters,
+                        'nodes': n_nodes,
+                        'tam_volatility': volatility,
+                        'method': name,
+                        'params': params,
+                        **result
+                    })
+                    print_record(records[-1])
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeats': repeats,
+            'seed': seed
+        },
+        'results': records
+    }
+
+def print_record(record):
+    """Print one benchmark result as a table row"""
+    print(f"{record['instance']:22} {record['method']:16}", end="")
+    if record['status'] != 'ok':
+        print(f" {record['status']} {record.get('error', '')}")
+        return
+    profit = 'n/a' if record['net_profit'] is None else f"{record['net_profit']:.1f}"
+    print(f" {record['time_median'] * 1000:10.1f} ms {record['peak_memory'] / 1e6:8.1f} MB"
+          f"  feasible={record['feasible']!s:5}  change={record['total_change']}  profit={profit}")
+
+def compare_results(baseline, current, threshold=0.2):
+    """List regressions of `current` against `baseline`: slower or larger runs, lost feasibility, new errors"""
+    before = {(r['instance'], r['method']): r for r in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        old = before.get((record['instance'], record['method']))
+        if old is None or old['status'] != 'ok':
+            continue
+        key = f"{record['instance']} {record['method']}"
+        if record['status'] != 'ok':
+            regressions.append(f"{key}: {record['status']} {record.get('error', '')}")
+            continue
+        if record['time_min'] > old['time_min'] * (1 + threshold):
+            regressions.append(f"{key}: time {old['time_min']:.4f}s -> {record['time_min']:.4f}s")
+        if record['peak_memory'] > old['peak_memory'] * (1 + threshold):
+            regressions.append(f"{key}: peak memory {old['peak_memory']} -> {record['peak_memory']} bytes")
+        if old['feasible'] and not record['feasible']:
+            regressions.append(f"{key}: plan no longer feasible")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading-plan methods on synthetic instances")
+    parser.add_argument('--quarters', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[3, 6, 12])
+    parser.add_argument('--volatility', type=float, nargs='+', default=[0.0, 0.05])
+    parser.add_argument('--methods', nargs='+', default=list(DEFAULT_METHODS), metavar='METHOD')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json', help="where to write the JSON results")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="JSON results of an earlier run; regressions are listed and exit with status 1")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    for name in args.methods:
+        if name not in METHODS:
+            parser.error(f"unknown method {name!r} (choose from {', '.join(METHODS)})")
+    methods = {name: DEFAULT_METHODS.get(name, {}) for name in args.methods}
+
+    results = run_benchmark(args.quarters, args.nodes, args.volatility, methods, args.repeats, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(json.load(f), results, args.threshold)
+        print(f"\n{len(regressions)} regression(s) against {args.compare}")
+        for regression in regressions:
+            print(f"  {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
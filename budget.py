@@ -0,0 +1,79 @@
+
+# time and gap budgets
+import contextvars
+import queue
+import threading
+import time
+
+from instrumentation import count
+
+class Budget:
+    """Time limit and MIP gap for one solve, with a callback for improving plans
+
+    time_limit (seconds) counts from when the budget is created. Solver backends
+    are given the remaining time and mip_gap as their limits, and the Python
+    searches check expired() between steps. A method calls incumbent() with each
+    plan that improves on the last one it reported; the latest is kept in `best`
+    and passed to on_incumbent(plan, objective, elapsed seconds).
+    """
+
+    def __init__(self, time_limit=None, mip_gap=None, on_incumbent=None):
+        self.start = time.perf_counter()
+        self.time_limit = time_limit
+        self.mip_gap = mip_gap
+        self.on_incumbent = on_incumbent
+        self.best = None
+        self.best_objective = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        """Seconds left (never negative), or None without a time limit"""
+        if self.time_limit is None:
+            return None
+        return max(self.time_limit - self.elapsed(), 0.0)
+
+    def expired(self):
+        return self.time_limit is not None and self.elapsed() >= self.time_limit
+
+    def incumbent(self, plan, objective=None):
+        """Report an improving plan; a repeat of the last objective (solvers may send one twice) is ignored"""
+        if objective is not None and objective == self.best_objective:
+            return
+        self.best, self.best_objective = plan, objective
+        count('budget.incumbents')
+        if self.on_incumbent is not None:
+            self.on_incumbent(plan, objective, self.elapsed())
+
+def incumbents(function, time_limit=None, mip_gap=None, **params):
+    """Run a get_*_loading_plan function in a thread, yielding (plan, objective, elapsed seconds) as plans improve
+
+    The returned plan is yielded last if it was not already reported; nothing
+    is yielded if no plan was found within the budget.
+    """
+    found = queue.Queue()
+    done = object()
+    budget = Budget(time_limit, mip_gap, lambda *incumbent: found.put(incumbent))
+    result = {}
+
+    def run():
+        try:
+            result['plan'] = function(budget=budget, **params)
+        except BaseException as exc:
+            result['error'] = exc
+        finally:
+            found.put(done)
+
+    # The worker runs in a copy of this context so an active trace still records it
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(run,), daemon=True)
+    thread.start()
+    while (item := found.get()) is not done:
+        yield item
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    plan = result['plan']
+    if plan is not None and (budget.best is None or not plan == budget.best):
+        yield plan, None, budget.elapsed()
@@ -0,0 +1,145 @@
+
+# solution cache
+import functools
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+from scenario import ARRAYS, SCALARS, default_scenario
+
+# Bump when the layout of cached entries changes
+CACHE_VERSION = 1
+
+# Default size bound of a cache directory
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Source files whose contents are part of every key: the methods, the analysis they feed
+# and the instrumentation and budget modules every method imports
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCES = [os.path.join(ROOT, 'calculate_profits.py'), os.path.join(ROOT, 'scenario.py'), os.path.join(ROOT, 'plans.py'),
+           os.path.join(ROOT, 'instrumentation.py'), os.path.join(ROOT, 'budget.py'),
+           os.path.join(ROOT, 'methods', '*.py')]
+
+def scenario_digest(scenario=None):
+    """SHA-256 of every input of a scenario (names, arrays with their dtypes and shapes, scalars)"""
+    if scenario is None:
+        scenario = default_scenario()
+    digest = hashlib.sha256()
+    digest.update(json.dumps([scenario.nodes, scenario.workstations]).encode())
+    for name in ARRAYS:
+        values = np.ascontiguousarray(getattr(scenario, name))
+        digest.update(f'{name}:{values.dtype.str}:{values.shape}'.encode())
+        digest.update(values.tobytes())
+    digest.update(json.dumps({name: float(getattr(scenario, name)) for name in SCALARS}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def source_digest(*paths):
+    """SHA-256 of source files, so editing a method invalidates its cached plans"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Digest of the planning code, computed once per process"""
+    return source_digest(*sorted(path for pattern in SOURCES for path in glob.glob(pattern)))
+
+def method_cache_key(name, params, scenario=None):
+    """Cache key of a registered method run with its default parameters applied"""
+    from methods import METHODS
+
+    defaults = METHODS[name][3]
+    return cache_key(name, {**defaults, **params}, scenario, code_version())
+
+def cache_key(method, params, scenario=None, code=''):
+    """Content address of a method run: the method, its parameters, the scenario and the code version"""
+    payload = json.dumps({
+        'version': CACHE_VERSION,
+        'method': method,
+        'params': {key: repr(value) for key, value in params.items() if key != 'scenario'},
+        'scenario': scenario_digest(scenario),
+        'code': code
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class SolutionCache:
+    """Directory of pickled results keyed by content address, bounded in size with LRU eviction
+
+    Entries are written to a temporary file and renamed into place, so concurrent
+    processes sharing the directory only ever read complete entries. A hit touches
+    the entry's modification time, which eviction uses as the last-use time.
+    """
+
+    def __init__(self, path, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def entry_path(self, key):
+        return os.path.join(self.path, f'{key}.pkl')
+
+    def get(self, key, default=None):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Unreadable entry (e.g. written by an incompatible version): drop it and re-solve
+            self.discard(path)
+            return default
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # Evicted by another process since it was read
+            pass
+        return value
+
+    def put(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.entry_path(key))
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.discard(path)
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(('.pkl', '.tmp')):
+                self.discard(entry.path)
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # Another process got there first
+            pass
@@ -3,14 +3,40 @@
 import numpy as np
 from math import ceil
 
+from instrumentation import phase
+from plans import ToolSchedule, loading_array
+
 # Constants from part 1a
 QUARTERS = 8
 WEEKS_PER_QUARTER = 13
 
 # TAM and pricing data
 tam_base = np.array([21.8, 27.4, 34.9, 39.0, 44.7, 51.5, 52.5, 53.5])
+tam_range = 2.0  # ±2 billion GBs
 contribution_margin_per_gb = 0.002  # $0.002 per GB
 
+# Product specifications, yields and the initial loading; the solver modules take their data from here
+NODES = ['Node1', 'Node2', 'Node3']
+
+gb_per_wafer = {
+    'Node1': 100000,  # 100k
+    'Node2': 150000,  # 150k
+    'Node3': 270000   # 270k
+}
+
+yields = {
+    'Node1': [0.98, 0.98, 0.98, 0.98, 0.98, 0.98, 0.98, 0.98],
+    'Node2': [0.60, 0.82, 0.95, 0.98, 0.98, 0.98, 0.98, 0.98],
+    'Node3': [0.20, 0.25, 0.35, 0.50, 0.65, 0.85, 0.95, 0.98]
+}
+
+# Initial weekly loading for Q1'26
+initial_loading = {
+    'Node1': 12000,
+    'Node2': 5000,
+    'Node3': 1000
+}
+
 # Tool information
 workstations = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J']
 
@@ -66,49 +92,156 @@ def calculate_capex(prev_tools, current_tools):
 def calculate_quarterly_output(loading, quarter):
     """Calculate total GB output for a given quarter's loading (from part 1a)"""
     output = 0
-    output += loading['Node1'] * WEEKS_PER_QUARTER * 100000 * 0.98  # Node1
-    output += loading['Node2'] * WEEKS_PER_QUARTER * 150000 * yields['Node2'][quarter]  # Node2
-    output += loading['Node3'] * WEEKS_PER_QUARTER * 270000 * yields['Node3'][quarter]  # Node3
+    for node in NODES:
+        output += loading[node] * WEEKS_PER_QUARTER * gb_per_wafer[node] * yields[node][quarter]
     return output / 1e9  # Convert to billions of GBs
 
-# Yield data from part 1a
-yields = {
-    'Node2': [0.60, 0.82, 0.95, 0.98, 0.98, 0.98, 0.98, 0.98],
-    'Node3': [0.20, 0.25, 0.35, 0.50, 0.65, 0.85, 0.95, 0.98]
-}
+# Array forms of the tables above, used to score many plans at once
+# Minute load of one wafer per week for each node at each workstation (nodes x workstations)
+minute_load_matrix = np.array([[minute_load[node][ws] for ws in workstations] for node in NODES])
+available_minutes = np.array([7 * 24 * 60 * utilization[ws] for ws in workstations])  # Weekly available minutes
+capex_vector = np.array([capex_per_tool[ws] for ws in workstations])
+initial_tool_vector = np.array([initial_tool_count[ws] for ws in workstations])
+
+# Yield for each quarter and node (quarters x nodes) and GB per wafer for each node
+yield_matrix = np.array([[yields[node][quarter] for node in NODES] for quarter in range(QUARTERS)])
+gb_per_wafer_vector = np.array([gb_per_wafer[node] for node in NODES])
+
+# Quarterly GB output of one wafer loaded per week, for each quarter and node (quarters x nodes;
+# yield x GB per wafer x weeks per quarter, so the weeks factor is already included)
+wafer_gb = WEEKS_PER_QUARTER * gb_per_wafer_vector * yield_matrix
+
+def profit_tables(scenario=None):
+    """Array tables used for plan analysis, from a scenario.Scenario or the module defaults"""
+    if scenario is None:
+        return (NODES, workstations, minute_load_matrix, available_minutes, capex_vector,
+                initial_tool_vector, wafer_gb, contribution_margin_per_gb)
+    return (scenario.nodes, scenario.workstations, scenario.minute_load, scenario.available_minutes,
+            scenario.capex_per_tool, scenario.initial_tools, scenario.wafer_gb, scenario.contribution_margin_per_gb)
+
+def analyze_loading_plans(loading_plans, scenario=None):
+    """Analyze a (plans x quarters x nodes) array of loadings to calculate tools, CAPEX, and profit for every plan"""
+    _, ws_names, loads, minutes, capex_costs, initial_tools, output_per_wafer, margin = profit_tables(scenario)
+    loading_plans = np.asarray(loading_plans, dtype=float)
+    n_quarters = loading_plans.shape[1]
+
+    # Tools needed per plan, quarter and workstation, rounded up to nearest integer
+    tools_needed = np.ceil(loading_plans @ loads / minutes).astype(np.int64)
+
+    # CAPEX for tools added over the previous quarter (the initial tool count before Q1)
+    prev_tools = np.concatenate([
+        np.broadcast_to(initial_tools, (len(loading_plans), 1, len(ws_names))),
+        tools_needed[:, :-1]
+    ], axis=1)
+    capex = np.maximum(tools_needed - prev_tools, 0) @ capex_costs
+
+    # Output in billions of GBs and revenue in USD
+    output = np.einsum('pqn,qn->pq', loading_plans, output_per_wafer[:n_quarters]) / 1e9
+    revenue = output * 1e9 * margin
 
-def analyze_loading_plan(loading_plan):
+    return {
+        'tools_needed': tools_needed,
+        'capex': capex,
+        'output': output,
+        'revenue': revenue,
+        'total_capex': capex.sum(axis=1),
+        'net_profit': revenue.sum(axis=1) / 1e6 - capex.sum(axis=1)  # In millions USD
+    }
+
+def analyze_loading_plan(loading_plan, scenario=None):
     """Analyze loading plan to calculate tools, CAPEX, and profit"""
-    current_tools = initial_tool_count.copy()
-    total_capex = 0
+    node_names, ws_names = profit_tables(scenario)[:2]
+    loadings = loading_array(loading_plan, node_names)
+    analysis = analyze_loading_plans(loadings[None], scenario)
+    tool_schedule = ToolSchedule(analysis['tools_needed'][0], ws_names)
+
     quarterly_results = []
-    
     for quarter, loading in enumerate(loading_plan):
-        # Calculate tool requirements
-        tools_needed = calculate_quarterly_tools_needed(loading)
-        
-        # Calculate CAPEX for this quarter
-        quarter_capex = calculate_capex(current_tools, tools_needed)
-        total_capex += quarter_capex
-        
-        # Calculate output and revenue
-        output = calculate_quarterly_output(loading, quarter)
-        revenue = output * 1e9 * contribution_margin_per_gb  # Convert back to GB for revenue calc
-        
-        # Store results
         quarterly_results.append({
             'quarter': quarter,
             'loading': loading,
-            'tools_needed': tools_needed,
-            'capex': quarter_capex,
-            'output': output,
-            'revenue': revenue
+            'tools_needed': tool_schedule[quarter],
+            'capex': float(analysis['capex'][0, quarter]),
+            'output': float(analysis['output'][0, quarter]),
+            'revenue': float(analysis['revenue'][0, quarter])
         })
-        
-        # Update current tools for next quarter
-        current_tools = tools_needed.copy()
     
-    return quarterly_results, total_capex
+    return quarterly_results, float(analysis['total_capex'][0])
+
+def draw_yield_curves(rng, n_draws, ramp_sd):
+    """Draw (draws x quarters x nodes) yield curves with each node's ramp shifted earlier or later"""
+    # A positive shift (in quarters) means the node ramps later than planned
+    shifts = rng.normal(0.0, ramp_sd, size=(n_draws, len(NODES)))
+    positions = np.clip(np.arange(QUARTERS)[None, :, None] - shifts[:, None, :], 0, QUARTERS - 1)
+
+    # Linear interpolation between the planned quarterly yields
+    low = np.floor(positions).astype(np.int64)
+    high = np.minimum(low + 1, QUARTERS - 1)
+    weight = positions - low
+    node_index = np.arange(len(NODES))
+    return (1 - weight) * yield_matrix[low, node_index] + weight * yield_matrix[high, node_index]
+
+def simulate_loading_plan(loading_plan, n_draws=100000, tam_sd=0.05, ramp_sd=0.5, seed=None, chunk_size=100000):
+    """Evaluate a fixed loading plan against random TAM and yield-ramp scenarios
+
+    TAM is drawn per quarter as tam_base * (1 + tam_sd * z) and each node's yield
+    curve is shifted by a normal number of quarters (standard deviation ramp_sd).
+    Sales are capped at the realised TAM. A tool shortfall is counted when scaling
+    the quarter's loading up to reach the bottom of the TAM band would need more
+    tools than the plan buys.
+    """
+    rng = np.random.default_rng(seed)
+    loadings = loading_array(loading_plan, NODES).astype(float)
+    n_quarters = len(loadings)
+
+    # Tools and CAPEX depend only on the loading, so they are the same in every scenario
+    analysis = analyze_loading_plans(loadings[None])
+    planned_tools = analysis['tools_needed'][0]
+    total_capex = analysis['total_capex'][0]
+    minutes_needed = loadings @ minute_load_matrix  # quarters x workstations
+
+    under_count = np.zeros(n_quarters, dtype=np.int64)
+    over_count = np.zeros(n_quarters, dtype=np.int64)
+    shortfall_count = np.zeros(n_quarters, dtype=np.int64)
+    any_miss_count = 0
+    any_shortfall_count = 0
+    profits = np.empty(n_draws)
+
+    for start in range(0, n_draws, chunk_size):
+        size = min(chunk_size, n_draws - start)
+        tam = tam_base[:n_quarters] * (1 + tam_sd * rng.standard_normal((size, n_quarters)))
+        curves = draw_yield_curves(rng, size, ramp_sd)[:, :n_quarters]
+
+        # Output in billions of GBs for every scenario and quarter
+        output = np.einsum('qn,dqn->dq', loadings, WEEKS_PER_QUARTER * gb_per_wafer_vector * curves) / 1e9
+        under = output < tam - tam_range
+        over = output > tam + tam_range
+        under_count += under.sum(axis=0)
+        over_count += over.sum(axis=0)
+        any_miss_count += int((under | over).any(axis=1).sum())
+
+        revenue = np.minimum(output, tam).sum(axis=1) * 1e9 * contribution_margin_per_gb
+        profits[start:start + size] = revenue / 1e6 - total_capex
+
+        # Loading scale-up needed to reach the bottom of the TAM band, and the tools it would take
+        scale = np.maximum((tam - tam_range) / np.maximum(output, 1e-12), 1.0)
+        required_tools = np.ceil(scale[:, :, None] * minutes_needed / available_minutes)
+        shortfall = (required_tools > planned_tools).any(axis=2)
+        shortfall_count += shortfall.sum(axis=0)
+        any_shortfall_count += int(shortfall.any(axis=1).sum())
+
+    percentiles = [5, 25, 50, 75, 95]
+    return {
+        'n_draws': n_draws,
+        'under_tam_probability': under_count / n_draws,
+        'over_tam_probability': over_count / n_draws,
+        'miss_probability': (under_count + over_count) / n_draws,
+        'any_miss_probability': any_miss_count / n_draws,
+        'shortfall_rate': shortfall_count / n_draws,
+        'any_shortfall_rate': any_shortfall_count / n_draws,
+        'profit_mean': float(profits.mean()),
+        'profit_percentiles': dict(zip(percentiles, np.percentile(profits, percentiles)))
+    }
 
 def print_analysis(results, total_capex):
     """Print detailed analysis results"""
@@ -127,9 +260,10 @@ def print_analysis(results, total_capex):
         
         print(f"{quarter_name:8} {res['output']:11.1f} {revenue:11.1f} {capex:10.1f} {net:9.1f}")
     
+    ws_names = list(results[0]['tools_needed']) if results else workstations
     print("\nTool Requirements by Quarter:")
     print("Quarter ", end="")
-    for ws in workstations:
+    for ws in ws_names:
         print(f"{ws:4}", end="")
     print()
     print("-" * 50)
@@ -138,7 +272,7 @@ def print_analysis(results, total_capex):
         q = res['quarter']
         quarter_name = f"Q{q+1}'26" if q < 4 else f"Q{q-3}'27"
         print(f"{quarter_name:8}", end="")
-        for ws in workstations:
+        for ws in ws_names:
             print(f"{res['tools_needed'][ws]:4}", end="")
         print()
     
@@ -147,8 +281,26 @@ def print_analysis(results, total_capex):
     print(f"Net Profit: ${(total_revenue - total_capex):.1f}M")
 
 
-def run_analysis(loading_plan):
-    results, total_capex = analyze_loading_plan(loading_plan)
+def run_analysis(loading_plan, scenario=None):
+    with phase('analysis'):
+        results, total_capex = analyze_loading_plan(loading_plan, scenario)
     print_analysis(results, total_capex)
     print()
 
+def print_simulation(summary):
+    """Print Monte Carlo robustness results"""
+    print(f"\nMonte Carlo Analysis ({summary['n_draws']} draws):")
+    print("Quarter  Under TAM  Over TAM  Tool Shortfall")
+    print("-" * 45)
+
+    for q, (under, over, shortfall) in enumerate(zip(summary['under_tam_probability'],
+                                                     summary['over_tam_probability'],
+                                                     summary['shortfall_rate'])):
+        quarter_name = f"Q{q+1}'26" if q < 4 else f"Q{q-3}'27"
+        print(f"{quarter_name:8} {under:9.1%} {over:9.1%} {shortfall:15.1%}")
+
+    print(f"\nP(any quarter outside TAM range): {summary['any_miss_probability']:.1%}")
+    print(f"P(any tool shortfall): {summary['any_shortfall_rate']:.1%}")
+    print(f"Mean Net Profit: ${summary['profit_mean']:.1f}M")
+    for percentile, profit in summary['profit_percentiles'].items():
+        print(f"P{percentile} Net Profit: ${profit:.1f}M")
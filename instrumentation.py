@@ -0,0 +1,86 @@
+
+# instrumentation
+import contextvars
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+# Trace collecting measurements in the current context; None when instrumentation is disabled
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# Shared no-op context manager returned by phase() while disabled
+DISABLED_PHASE = nullcontext()
+
+class Trace:
+    """Phase timings, solver statistics and counters recorded during a run"""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.start = time.perf_counter()
+        self.phases = {}    # phase name -> total seconds
+        self.stats = {}     # section (method) -> solver statistics
+        self.counters = {}  # counter name -> count
+        self.events = []    # every phase in the order it finished, for the JSON trace
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + duration
+            self.events.append({'phase': name, 'start': start - self.start, 'duration': duration})
+
+    def record(self, section, **stats):
+        self.stats.setdefault(section, {}).update(stats)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'total': time.perf_counter() - self.start,
+            'phases': self.phases,
+            'stats': self.stats,
+            'counters': self.counters,
+            'events': self.events
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+def enabled():
+    """Whether a trace is active (use to skip gathering statistics that are only recorded)"""
+    return current_trace.get() is not None
+
+def phase(name):
+    """Context manager timing a named phase in the active trace"""
+    trace = current_trace.get()
+    return DISABLED_PHASE if trace is None else trace.phase(name)
+
+def record(section, **stats):
+    """Record solver statistics for a section (usually the method name) in the active trace"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.record(section, **stats)
+
+def count(name, n=1):
+    """Add to a named counter in the active trace"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.count(name, n)
+
+@contextmanager
+def tracing(name=None, path=None):
+    """Enable instrumentation for the enclosed code; yields the Trace and optionally writes it as JSON"""
+    trace = Trace(name)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        if path is not None:
+            trace.write_json(path)
@@ -1,4 +1,51 @@
-from .brute_force import get_brute_force_loading_plan
-from .docplex_barrier import get_docplex_barrier_loading_plan
-from .naive import get_naive_loading_plan
-from .pulp_simplex import get_pulp_simplex_loading_plan
\ No newline at end of file
+import functools
+import importlib
+
+# Registered loading-plan methods: name -> (module, entry point, label, default parameters).
+# Modules are only imported when a method is used, so a run pays for the solver backends it needs.
+METHODS = {
+    'docplex_barrier': ('.docplex_barrier', 'get_docplex_barrier_loading_plan', 'Docplex', {}),
+    'docplex_profit': ('.docplex_profit', 'get_docplex_profit_loading_plan', 'Docplex Profit', {}),
+    'docplex_rounded': ('.docplex_barrier', 'get_docplex_barrier_loading_plan', 'Docplex (LP Rounding)',
+                        {'fast': True}),
+    'pulp_simplex': ('.pulp_simplex', 'get_pulp_simplex_loading_plan', 'Pulp', {}),
+    'naive': ('.naive', 'get_naive_loading_plan', 'Naive', {}),
+    'brute_force': ('.brute_force', 'get_brute_force_loading_plan', 'Brute Force', {}),
+    'brute_force_vectorized': ('.brute_force', 'get_brute_force_loading_plan', 'Brute Force (Vectorized)',
+                               {'vectorized': True}),
+    'matrix_highs': ('.matrix_model', 'get_matrix_model_loading_plan', 'Matrix Model (HiGHS)', {'backend': 'highs'}),
+    'dynamic_programming': ('.dynamic_programming', 'get_dynamic_programming_loading_plan', 'Dynamic Programming', {}),
+    'local_search': ('.local_search', 'get_local_search_loading_plan', 'Local Search', {}),
+}
+
+# Other public names and the module that defines them
+EXPORTS = {
+    'DocplexPlanner': '.docplex_barrier',
+    'solve_scenarios': '.scenarios',
+    'replan': '.rolling_horizon',
+    'improve_plan': '.local_search',
+    'pareto_frontier': '.frontier',
+    'WhatIf': '.sensitivity',
+    'pulp_what_if': '.sensitivity',
+    'docplex_what_if': '.sensitivity',
+}
+EXPORTS.update({entry_point: module for module, entry_point, _, _ in METHODS.values()})
+
+def get_method(name):
+    """Import a registered method's module and return its entry point with the default parameters applied"""
+    if name not in METHODS:
+        raise ValueError(f"Unknown method: {name}")
+    module, entry_point, _, defaults = METHODS[name]
+    function = getattr(importlib.import_module(module, __name__), entry_point)
+
+    @functools.wraps(function)
+    def run(**params):
+        return function(**{**defaults, **params})
+    return run
+
+def __getattr__(name):
+    if name in EXPORTS:
+        return getattr(importlib.import_module(EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = ['METHODS', 'get_method'] + list(EXPORTS)
@@ -1,33 +1,23 @@
 import numpy as np
 
-# Constants from the problem
-QUARTERS = 8  # Q1'26 to Q4'27
-WEEKS_PER_QUARTER = 13
-
-# TAM data (billions of GBs)
-tam_base = np.array([21.8, 27.4, 34.9, 39.0, 44.7, 51.5, 52.5, 53.5])
-tam_range = 2.0  # ±2 billion GBs
-
-# Product specifications
-gb_per_wafer = {
-    'Node1': 100000,  # 100k
-    'Node2': 150000,  # 150k
-    'Node3': 270000   # 270k
-}
-
-# Yield data
-yields = {
-    'Node1': [0.98, 0.98, 0.98, 0.98, 0.98, 0.98, 0.98, 0.98],
-    'Node2': [0.60, 0.82, 0.95, 0.98, 0.98, 0.98, 0.98, 0.98],
-    'Node3': [0.20, 0.25, 0.35, 0.50, 0.65, 0.85, 0.95, 0.98]
-}
-
-# Initial conditions for Q1'26
-initial_loading = {
-    'Node1': 12000,
-    'Node2': 5000,
-    'Node3': 1000
-}
+from instrumentation import count
+from plans import LoadingPlan
+
+# Competition data (Q1'26 to Q4'27; TAM in billions of GBs)
+from calculate_profits import (
+    QUARTERS,
+    WEEKS_PER_QUARTER,
+    NODES,
+    tam_base,
+    tam_range,
+    gb_per_wafer,
+    yields,
+    initial_loading,
+    wafer_gb  # Quarterly GB output of one wafer loaded per week (quarters x nodes)
+)
+
+# Upper bound on the number of candidates evaluated in one NumPy block
+MAX_BLOCK_CANDIDATES = 1_000_000
 
 def calculate_quarterly_output(loading, quarter):
     """Calculate total GB output for a given quarter's loading"""
@@ -48,46 +38,272 @@ def is_within_tam_range(output, quarter):
     """Check if output is within the acceptable TAM range"""
     return (tam_base[quarter] - tam_range) <= output <= (tam_base[quarter] + tam_range)
 
-def find_valid_loading():
-    """Find a valid loading profile for all quarters"""
+def tighten_to_band(low, high, quarter_wafer_gb, tam_min, tam_max):
+    """Shrink one quarter's per-node bounds (in place) to loadings that can meet the TAM band
+
+    A node cannot be so high that output exceeds the band with every other node
+    at its minimum, nor so low that output falls short with the others at their maximum.
+    """
+    total_low = quarter_wafer_gb @ low
+    total_high = quarter_wafer_gb @ high
+    producing = quarter_wafer_gb > 0
+    gb = quarter_wafer_gb[producing]
+    # Small slack so floating-point error never cuts off a loading exactly on the band edge
+    node_high = np.floor((tam_max - (total_low - gb * low[producing])) / gb + 1e-6)
+    node_low = np.ceil((tam_min - (total_high - gb * high[producing])) / gb - 1e-6)
+    high[producing] = np.minimum(high[producing], node_high)
+    low[producing] = np.maximum(low[producing], node_low)
+
+def reachable_bounds(scenario=None, max_passes=100):
+    """Per-node loading bounds (quarters x nodes) outside which no plan can meet every later TAM band
+
+    A forward pass bounds the loadings reachable from the initial loading under
+    the transition limit, a backward pass the loadings from which the next
+    quarter's bounds can still be reached, and each quarter is tightened against
+    its TAM band; passes repeat until nothing changes. The bounds are necessary
+    conditions, so searches can discard candidates outside them without losing
+    plans. Returns (low, high), or None if some quarter can never be met.
+    """
+    if scenario is None:
+        start = np.array([initial_loading[node] for node in NODES], dtype=float)
+        all_wafer_gb, tam, band, max_change = wafer_gb, tam_base, tam_range, 2500
+    else:
+        start = np.asarray(scenario.initial_loading, dtype=float)
+        all_wafer_gb, tam, band, max_change = scenario.wafer_gb, scenario.tam, scenario.tam_range, scenario.max_change
+    n_quarters = len(tam)
+    tam_min = (np.asarray(tam) - band) * 1e9
+    tam_max = (np.asarray(tam) + band) * 1e9
+
+    low = np.zeros((n_quarters, len(start)))
+    high = np.full((n_quarters, len(start)), np.inf)
+    low[0] = high[0] = start  # The first quarter is fixed
+    for _ in range(max_passes):
+        previous = low.copy(), high.copy()
+        for quarter in range(1, n_quarters):
+            low[quarter] = np.maximum(low[quarter], np.maximum(low[quarter - 1] - max_change, 0))
+            high[quarter] = np.minimum(high[quarter], high[quarter - 1] + max_change)
+            tighten_to_band(low[quarter], high[quarter], all_wafer_gb[quarter], tam_min[quarter], tam_max[quarter])
+        for quarter in range(n_quarters - 2, 0, -1):
+            low[quarter] = np.maximum(low[quarter], low[quarter + 1] - max_change)
+            high[quarter] = np.minimum(high[quarter], high[quarter + 1] + max_change)
+            tighten_to_band(low[quarter], high[quarter], all_wafer_gb[quarter], tam_min[quarter], tam_max[quarter])
+
+        if (low > high).any():
+            return None
+        if np.array_equal(previous[0], low) and np.array_equal(previous[1], high):
+            break
+    return low.astype(np.int64), high.astype(np.int64)
+
+def candidate_range(prev, rangee, step, low=None, high=None):
+    """Search range of one node around its previous loading, clipped to bounds without shifting the grid"""
+    first, last = max(0, prev - rangee), prev + rangee
+    if low is not None and low > first:
+        first += -(-(low - first) // step) * step
+    if high is not None:
+        last = min(last, high)
+    return range(first, last + 1, step)
+
+def loop_candidates(prev_loading, current_loading, quarter, ranges, budget=None):
+    """Write each loading that meets TAM and transition limits into current_loading, in n1, n2, n3 order
+
+    Yields current_loading after each one; stops early once a budget.Budget
+    has expired (checked for every Node2 value tried).
+    """
+    for n1 in ranges[0]:
+        for n2 in ranges[1]:
+            if budget is not None and budget.expired():
+                return
+            evaluated = 0
+            for n3 in ranges[2]:
+                current_loading['Node1'] = n1
+                current_loading['Node2'] = n2
+                current_loading['Node3'] = n3
+                evaluated += 1
+
+                # Calculate output and check constraints
+                output = calculate_quarterly_output(current_loading, quarter)
+
+                if (is_within_tam_range(output, quarter) and
+                    is_valid_transition(prev_loading, current_loading)):
+                    count('brute_force.candidates', evaluated)
+                    evaluated = 0
+                    yield current_loading
+            count('brute_force.candidates', evaluated)
+
+def find_valid_loading(rangee=1500, step=500, bounds=None, budget=None):
+    """Find a valid loading profile for all quarters
+
+    With bounds from reachable_bounds, candidates outside them are never
+    generated and the search backtracks out of dead ends (remembering loadings
+    already known to fail), so it finds a plan whenever the candidate grid
+    contains one. Without them, the first candidate of each quarter is kept
+    and a dead end ends the search. A budget.Budget is checked for every
+    Node2 value tried.
+    """
     # Initialize results with the first quarter's known values
-    results = [{
-        'Node1': initial_loading['Node1'],
-        'Node2': initial_loading['Node2'],
-        'Node3': initial_loading['Node3']
-    }]
-    
-    # For each subsequent quarter
-    for quarter in range(1, QUARTERS):
-        found_valid = False
-        
-        rangee = 1500
-        step = 500
-
-        # Try different loading combinations
-        for n1 in range(max(0, results[-1]['Node1'] - rangee), results[-1]['Node1'] + rangee + 1, step):
-            for n2 in range(max(0, results[-1]['Node2'] - rangee), results[-1]['Node2'] + rangee + 1, step):
-                for n3 in range(max(0, results[-1]['Node3'] - rangee), results[-1]['Node3'] + rangee + 1, step):
-                    current_loading = {'Node1': n1, 'Node2': n2, 'Node3': n3}
-                    
-                    # Calculate output and check constraints
-                    output = calculate_quarterly_output(current_loading, quarter)
-                    
-                    if (is_within_tam_range(output, quarter) and 
-                        is_valid_transition(results[-1], current_loading)):
-                        results.append(current_loading)
-                        found_valid = True
-                        break
-                if found_valid:
-                    break
-            if found_valid:
-                break
-                
-        if not found_valid:
-            print(f"Could not find valid loading for quarter {quarter + 1}")
+    results = LoadingPlan.zeros(QUARTERS, NODES)
+    results[0] = initial_loading
+    low, high = bounds if bounds is not None else (np.full((QUARTERS, len(NODES)), None),) * 2
+
+    def candidates(quarter):
+        # Candidates are written straight into the plan's row for this quarter
+        prev_loading = results[quarter - 1]
+        ranges = [candidate_range(prev_loading[node], rangee, step, low[quarter][i], high[quarter][i])
+                  for i, node in enumerate(NODES)]
+        return loop_candidates(prev_loading, results[quarter], quarter, ranges, budget)
+
+    if bounds is None:
+        for quarter in range(1, QUARTERS):
+            if next(candidates(quarter), None) is None:
+                if budget is not None and budget.expired():
+                    print(f"Time limit reached at quarter {quarter + 1}")
+                else:
+                    print(f"Could not find valid loading for quarter {quarter + 1}")
+                return None
+        return results
+
+    # Depth-first search with one candidate stream per quarter being decided,
+    # as in find_valid_loading_vectorized
+    streams = [None] * QUARTERS
+    streams[1] = candidates(1)
+    dead_ends = set()
+    quarter = 1
+    while quarter > 0:
+        if next(streams[quarter], None) is None:
+            if budget is not None and budget.expired():
+                print(f"Time limit reached at quarter {quarter + 1}")
+                return None
+            # Every continuation from the previous quarter's loading failed
+            quarter -= 1
+            dead_ends.add((quarter, results.array[quarter].tobytes()))
+            continue
+        if (quarter, results.array[quarter].tobytes()) in dead_ends:
+            continue
+        if quarter == QUARTERS - 1:
+            return results
+        quarter += 1
+        streams[quarter] = candidates(quarter)
+
+    print("Could not find valid loading")
+    return None
+
+def feasible_candidates(prev_loading, quarter, rangee, step, scenario=None, bounds=None, budget=None):
+    """Yield, in blocks and in n1, n2, n3 order, the candidate loadings that meet TAM and transition limits
+
+    With bounds from reachable_bounds, candidates outside them are never generated.
+    The candidates stop early once a budget.Budget has expired.
+    """
+    if scenario is None:
+        node_names, quarter_wafer_gb, max_change = NODES, wafer_gb[quarter], 2500
+        tam_min = tam_base[quarter] - tam_range
+        tam_max = tam_base[quarter] + tam_range
+    else:
+        node_names, quarter_wafer_gb, max_change = scenario.nodes, scenario.wafer_gb[quarter], scenario.max_change
+        tam_min = scenario.tam[quarter] - scenario.tam_range
+        tam_max = scenario.tam[quarter] + scenario.tam_range
+
+    prev = np.array([prev_loading[node] for node in node_names])
+    if bounds is None:
+        axes = [np.arange(max(0, p - rangee), p + rangee + 1, step) for p in prev]
+    else:
+        low, high = bounds[0][quarter], bounds[1][quarter]
+        axes = [np.array(candidate_range(int(p), rangee, step, int(low[i]), int(high[i]))) for i, p in enumerate(prev)]
+        if any(len(axis) == 0 for axis in axes):
+            return
+
+    # Evaluate the grid in blocks of Node1 values so memory stays bounded for fine steps
+    block_size = max(1, MAX_BLOCK_CANDIDATES // int(np.prod([len(axis) for axis in axes[1:]])))
+    for start in range(0, len(axes[0]), block_size):
+        if budget is not None and budget.expired():
+            return
+        grid = np.stack(np.meshgrid(axes[0][start:start + block_size], *axes[1:], indexing='ij'), axis=-1)
+        grid = grid.reshape(-1, len(node_names))
+        count('brute_force.candidates', len(grid))
+
+        output = grid @ quarter_wafer_gb / 1e9
+        feasible = (tam_min <= output) & (output <= tam_max)
+        feasible &= np.abs(grid - prev).max(axis=1) <= max_change
+
+        if feasible.any():
+            yield grid[feasible]
+
+def find_valid_candidate(prev_loading, quarter, rangee, step, scenario=None, bounds=None):
+    """Return the first candidate loading (in n1, n2, n3 order) that meets TAM and transition limits
+
+    The candidate is returned as an array in node order, or None if there is none.
+    """
+    for block in feasible_candidates(prev_loading, quarter, rangee, step, scenario, bounds):
+        return block[0]
+    return None
+
+def candidate_stream(prev_loading, quarter, rangee, step, scenario=None, bounds=None, budget=None):
+    for block in feasible_candidates(prev_loading, quarter, rangee, step, scenario, bounds, budget):
+        yield from block
+
+def find_valid_loading_vectorized(rangee=1500, step=500, scenario=None, prune=True, budget=None):
+    """Find a valid loading profile for all quarters, evaluating each quarter's candidate grid with NumPy
+
+    With prune, candidates are limited to the reachable bounds and the search
+    backtracks out of dead ends (remembering loadings already known to fail),
+    so it finds a plan whenever the candidate grid contains one. Without it,
+    the first candidate of each quarter is kept and a dead end ends the search.
+    A budget.Budget is checked before each quarter and each candidate tried.
+    """
+    if scenario is None:
+        results = LoadingPlan.zeros(QUARTERS, NODES)
+        results[0] = initial_loading
+    else:
+        results = LoadingPlan.zeros(scenario.n_quarters, scenario.nodes)
+        results[0] = scenario.initial_loading
+
+    if not prune:
+        for quarter in range(1, len(results)):
+            if budget is not None and budget.expired():
+                print(f"Time limit reached at quarter {quarter + 1}")
+                return None
+            current_loading = find_valid_candidate(results[quarter - 1], quarter, rangee, step, scenario)
+            if current_loading is None:
+                print(f"Could not find valid loading for quarter {quarter + 1}")
+                return None
+            results[quarter] = current_loading
+        return results
+
+    bounds = reachable_bounds(scenario)
+    if bounds is None:
+        print("No loading plan can meet every TAM band")
+        return None
+
+    # Depth-first search with one candidate stream per quarter being decided
+    n_quarters = len(results)
+    if n_quarters == 1:
+        return results
+    streams = [None] * n_quarters
+    streams[1] = candidate_stream(results[0], 1, rangee, step, scenario, bounds, budget)
+    dead_ends = set()
+    quarter = 1
+    while quarter > 0:
+        if budget is not None and budget.expired():
+            print(f"Time limit reached at quarter {quarter + 1}")
             return None
-            
-    return results
+        candidate = next(streams[quarter], None)
+        if candidate is None:
+            # Every continuation from the previous quarter's loading failed
+            quarter -= 1
+            dead_ends.add((quarter, results.array[quarter].tobytes()))
+            continue
+        if (quarter, candidate.tobytes()) in dead_ends:
+            continue
+        results[quarter] = candidate
+        if quarter == n_quarters - 1:
+            return results
+        quarter += 1
+        streams[quarter] = candidate_stream(results[quarter - 1], quarter, rangee, step, scenario, bounds, budget)
+
+    if budget is not None and budget.expired():
+        print("Time limit reached")
+        return None
+    print("Could not find valid loading")
+    return None
 
 def print_loading_plan(loading_plan):
     """Print the loading plan in a formatted table"""
@@ -106,6 +322,15 @@ def print_loading_plan(loading_plan):
         print(f"    {loading['Node1']:5d}   {loading['Node2']:5d}   {loading['Node3']:5d}   ",
               f"{output:11.1f}   [{tam_min:.1f}, {tam_max:.1f}]")
 
-def get_brute_force_loading_plan():
-    return find_valid_loading()
+def get_brute_force_loading_plan(vectorized=False, rangee=1500, step=500, scenario=None, prune=True, budget=None):
+    # The loop search is written for the three built-in nodes; scenarios always use the NumPy search
+    if vectorized or scenario is not None:
+        loading_plan = find_valid_loading_vectorized(rangee, step, scenario, prune, budget)
+    else:
+        bounds = reachable_bounds() if prune else None
+        loading_plan = find_valid_loading(rangee, step, bounds, budget)
+    # The search stops at the first valid plan, which is its only incumbent
+    if budget is not None and loading_plan is not None:
+        budget.incumbent(loading_plan)
+    return loading_plan
 
@@ -1,71 +1,329 @@
+import time
+
+import numpy as np
 from docplex.mp.model import Model
 
+import calculate_profits as cp
+from instrumentation import count, enabled, phase, record
+from plans import LoadingPlan
+
 # Sets and indices
-quarters = list(range(8))  # Q1'26 to Q4'27
+quarters = list(range(cp.QUARTERS))  # Q1'26 to Q4'27
 nodes = [1, 2, 3]
 
-# Parameters
+# Parameters from calculate_profits, with nodes numbered from 1
 # TAM forecast in billions of GBs for each quarter
-TAM = [21.8, 27.4, 34.9, 39.0, 44.7, 51.5, 52.5, 53.5]
+TAM = cp.tam_base.tolist()
 # GB per wafer for each node
-gb = {1: 100000, 2: 150000, 3: 270000}
+gb = {n: cp.gb_per_wafer[f'Node{n}'] for n in nodes}
 # Yield per node per quarter
-yield_dict = {
-    1: [0.98] * 8,
-    2: [0.60, 0.82, 0.95, 0.98, 0.98, 0.98, 0.98, 0.98],
-    3: [0.20, 0.25, 0.35, 0.50, 0.65, 0.85, 0.95, 0.98]
-}
+yield_dict = {n: list(cp.yields[f'Node{n}']) for n in nodes}
 # Initial weekly loading for Q1'26
+initial_loading = {n: cp.initial_loading[f'Node{n}'] for n in nodes}
+
+def build(mdl, tam=TAM, yields=yield_dict, start_loading=initial_loading, gb_per_wafer=gb, tam_range=2,
+          max_change=2500, integer=True):
+    """Add the minimum wafer change model to mdl; returns the x variables and each quarter's production constraints
 
-initial_loading = {1: 12000, 2: 5000, 3: 1000}
+    The first quarter is fixed through the bounds of its x variables so it can
+    be changed later, and each quarter has separate (lower, upper) production
+    constraints; docplex does not pass coefficient edits on range constraints
+    through to CPLEX. Constraints are named with quarters and nodes numbered
+    from 1, as in pulp_simplex.
+    """
+    # Nodes follow the keys of the initial loading and quarters the length of the TAM forecast
+    nodes = sorted(start_loading)
+    quarters = list(range(len(tam)))
 
-def solve(mdl):
     # Decision variables: x[node,q] = weekly loading (number of wafers) for each node and quarter
-    x = mdl.integer_var_dict(((node, q) for node in nodes for q in quarters), lb=0, name="x")
+    # (continuous for the LP relaxation)
+    var_dict = mdl.integer_var_dict if integer else mdl.continuous_var_dict
+    x = var_dict(((node, q) for node in nodes for q in quarters), lb=0, name="x")
     # Auxiliary variables for absolute change in loading between quarters
     diff = mdl.continuous_var_dict(((node, q) for node in nodes for q in range(1, len(quarters))), lb=0, name="diff")
 
     # Fix initial loading for Q1'26
     for node in nodes:
-        mdl.add_constraint(x[node, 0] == initial_loading[node])
+        x[node, 0].set_ub(start_loading[node])
+        x[node, 0].set_lb(start_loading[node])
 
     # Enforce maximum change of ±2500 wafers and capture the absolute differences
     for node in nodes:
         for q in range(1, len(quarters)):
-            mdl.add_constraint(x[node, q] - x[node, q-1] <= 2500)
-            mdl.add_constraint(x[node, q-1] - x[node, q] <= 2500)
-            mdl.add_constraint(diff[node, q] >= x[node, q] - x[node, q-1])
-            mdl.add_constraint(diff[node, q] >= x[node, q-1] - x[node, q])
+            mdl.add_constraint(x[node, q] - x[node, q-1] <= max_change, ctname=f"Increase_Q{q+1}_Node{node}")
+            mdl.add_constraint(x[node, q-1] - x[node, q] <= max_change, ctname=f"Decrease_Q{q+1}_Node{node}")
+            mdl.add_constraint(diff[node, q] >= x[node, q] - x[node, q-1], ctname=f"Abs_Pos_Q{q+1}_Node{node}")
+            mdl.add_constraint(diff[node, q] >= x[node, q-1] - x[node, q], ctname=f"Abs_Neg_Q{q+1}_Node{node}")
 
     # Production constraints: total production must lie within TAM ±2 billion GB
-    # Production per quarter = 13 (weeks) * x[node,q] * (GB per wafer * yield)
+    def production_expr(q):
+        """Production in quarter q = 13 (weeks) * x[node,q] * (GB per wafer * yield)"""
+        return mdl.sum(13 * x[node, q] * gb_per_wafer[node] * yields[node][q] for node in nodes)
+
+    production = {}
     for q in quarters:
-        total_production = mdl.sum(13 * x[node, q] * gb[node] * yield_dict[node][q] for node in nodes)
-        lower_bound = (TAM[q] - 2) * 1e9
-        upper_bound = (TAM[q] + 2) * 1e9
-        mdl.add_constraint(total_production >= lower_bound)
-        mdl.add_constraint(total_production <= upper_bound)
+        lower = mdl.add_constraint(production_expr(q) >= (tam[q] - tam_range) * 1e9, ctname=f"Production_Min_Q{q+1}")
+        upper = mdl.add_constraint(production_expr(q) <= (tam[q] + tam_range) * 1e9, ctname=f"Production_Max_Q{q+1}")
+        production[q] = (lower, upper)
 
     # Objective: minimize the total change in loading across quarters
     mdl.minimize(mdl.sum(diff[node, q] for node in nodes for q in range(1, len(quarters))))
+    return x, production
+
+def solve(mdl, tam=TAM, yields=yield_dict, start_loading=initial_loading, gb_per_wafer=gb, tam_range=2,
+          max_change=2500, log_output=True, integer=True, budget=None, node_names=None):
+    """Build and solve the minimum wafer change model; returns the solution (or None) and the x variables
 
-    solution = mdl.solve(log_output=True)
+    With a budget.Budget, CPLEX gets its time limit and MIP gap and reports
+    improving incumbents as plans with node_names columns.
+    """
+    with phase('docplex_barrier.build'):
+        x, _ = build(mdl, tam, yields, start_loading, gb_per_wafer, tam_range, max_change, integer)
+
+    if budget is not None:
+        if node_names is None:
+            node_names = {node: f'Node{node}' for node in sorted(start_loading)}
+        apply_budget(mdl, budget, lambda solution: plan_from_solution(solution, x, node_names))
+
+    with phase('docplex_barrier.solve'):
+        solution = mdl.solve(log_output=log_output)
+    if enabled():
+        record('docplex_barrier', **solve_statistics(mdl, solution))
     return solution, x
 
+def apply_budget(mdl, budget, to_plan):
+    """Pass a budget's time limit and MIP gap to CPLEX and report each improving incumbent as to_plan(solution)"""
+    from docplex.mp.progress import FunctionalSolutionListener, ProgressClock
+
+    if budget.time_limit is not None:
+        mdl.parameters.timelimit = budget.remaining()
+    if budget.mip_gap is not None:
+        mdl.parameters.mip.tolerances.mipgap = budget.mip_gap
+    mdl.add_progress_listener(FunctionalSolutionListener(
+        lambda solution: budget.incumbent(to_plan(solution), solution.objective_value), clock=ProgressClock.Objective))
+
+def solve_statistics(mdl, solution):
+    """Solve status, iterations, branch-and-bound nodes, MIP gap and objective of a solved docplex model"""
+    details = mdl.solve_details
+    return {
+        'status': details.status,
+        'iterations': details.nb_iterations,
+        'nodes_processed': details.nb_nodes_processed,
+        'mip_gap': details.mip_relative_gap,
+        'solver_time': details.time,
+        'objective': solution.objective_value if solution else None,
+        'variables': mdl.number_of_variables,
+        'constraints': mdl.number_of_constraints
+    }
+
+def scenario_data(scenario):
+    """Convert a scenario.Scenario into the keyword arguments of solve (nodes numbered from 1)"""
+    scenario_nodes = range(1, scenario.n_nodes + 1)
+    return {
+        'tam': list(scenario.tam),
+        'yields': {n: list(scenario.yields[:, n - 1]) for n in scenario_nodes},
+        'start_loading': {n: int(scenario.initial_loading[n - 1]) for n in scenario_nodes},
+        'gb_per_wafer': {n: scenario.gb_per_wafer[n - 1] for n in scenario_nodes},
+        'tam_range': scenario.tam_range,
+        'max_change': scenario.max_change
+    }
+
+def plan_from_solution(solution, x, node_names):
+    """Read the x[node, q] values of a solution into a LoadingPlan in one call"""
+    plan_quarters = sorted({q for _, q in x})
+    plan = LoadingPlan.zeros(len(plan_quarters), list(node_names.values()))
+    values = solution.get_values([x[node, q] for q in plan_quarters for node in node_names])
+    plan.array[:] = np.rint(values).reshape(plan.array.shape)
+    return plan
+
+def round_and_repair(values, quarter_wafer_gb, tam_low, tam_high, max_change):
+    """Round a relaxed (quarters x nodes) loading plan to whole wafers that keep every quarter feasible
+
+    Quarters are repaired in order: loadings are rounded and clipped to the
+    transition window of the repaired previous quarter, then if the quarter's
+    output (GB) is outside [tam_low, tam_high], whole wafers are added to or
+    removed from the nodes with the most output per wafer first. Returns the
+    integer plan, or None if a quarter cannot be brought inside the band.
+    """
+    plan = np.rint(values).astype(np.int64)
+    for q in range(1, len(plan)):
+        low = np.maximum(plan[q-1] - max_change, 0)
+        high = plan[q-1] + max_change
+        plan[q] = np.clip(plan[q], low, high)
+
+        output = plan[q] @ quarter_wafer_gb[q]
+        for n in np.argsort(-quarter_wafer_gb[q]):
+            if tam_low[q] <= output <= tam_high[q]:
+                break
+            if quarter_wafer_gb[q, n] <= 0:
+                continue
+            if output < tam_low[q]:
+                step = min(int(np.ceil((tam_low[q] - output) / quarter_wafer_gb[q, n])), high[n] - plan[q, n])
+            else:
+                step = -min(int(np.ceil((output - tam_high[q]) / quarter_wafer_gb[q, n])), plan[q, n] - low[n])
+            plan[q, n] += step
+            output += step * quarter_wafer_gb[q, n]
+        if not tam_low[q] <= output <= tam_high[q]:
+            return None
+    return plan
+
+def relax_and_round(node_names, tam=TAM, yields=yield_dict, start_loading=initial_loading, gb_per_wafer=gb,
+                    tam_range=2, max_change=2500, log_output=False, budget=None):
+    """Solve the LP relaxation and round it to a feasible plan, solving the MILP only if the repair fails
+
+    Returns the plan (or None if the model is infeasible) and a dict with the
+    LP bound, the plan's total change, its relative gap to the bound and
+    whether the MILP fallback was used.
+    """
+    solution, x = solve(Model("Wafer_Loading_Relaxation"), tam, yields, start_loading, gb_per_wafer, tam_range,
+                        max_change, log_output, integer=False, budget=budget, node_names=node_names)
+    if not solution:
+        return None, {'lp_bound': None, 'objective': None, 'gap': None, 'fallback': False}
+
+    plan_nodes = sorted(start_loading)
+    plan_quarters = range(len(tam))
+    with phase('docplex_barrier.repair'):
+        relaxed = np.reshape(solution.get_values([x[node, q] for q in plan_quarters for node in plan_nodes]),
+                             (len(tam), len(plan_nodes)))
+        quarter_wafer_gb = np.array([[13 * gb_per_wafer[node] * yields[node][q] for node in plan_nodes]
+                                     for q in plan_quarters])
+        tam = np.asarray(tam, dtype=float)
+        plan = round_and_repair(relaxed, quarter_wafer_gb, (tam - tam_range) * 1e9, (tam + tam_range) * 1e9,
+                                max_change)
+
+    stats = {'lp_bound': solution.objective_value, 'fallback': plan is None}
+    if plan is None:
+        count('docplex_barrier.fallback')
+        solution, x = solve(Model("Wafer_Loading_Optimization"), tam, yields, start_loading, gb_per_wafer, tam_range,
+                            max_change, log_output, budget=budget, node_names=node_names)
+        if not solution:
+            return None, {**stats, 'objective': None, 'gap': None}
+        plan = plan_from_solution(solution, x, node_names).array
+
+    stats['objective'] = int(np.abs(np.diff(plan, axis=0)).sum())
+    stats['gap'] = (stats['objective'] - stats['lp_bound']) / stats['objective'] if stats['objective'] else 0.0
+    if enabled():
+        record('docplex_barrier.rounding', **stats)
+    result = LoadingPlan(plan, [node_names[node] for node in plan_nodes])
+    if budget is not None and not stats['fallback']:
+        budget.incumbent(result, stats['objective'])
+    if log_output:
+        print(f"Total change {stats['objective']}, LP bound {stats['lp_bound']:.1f}, gap {stats['gap']:.2%}"
+              f"{' (MILP fallback)' if stats['fallback'] else ''}")
+    return result, stats
+
+def get_docplex_barrier_loading_plan(scenario=None, fast=False, budget=None):
+    """Minimum wafer change plan; fast=True rounds the LP relaxation instead of running branch-and-bound"""
+    if scenario is None:
+        data, log_output = {}, True
+        node_names = {node: f'Node{node}' for node in nodes}
+    else:
+        data, log_output = scenario_data(scenario), False
+        node_names = dict(enumerate(scenario.nodes, start=1))
+
+    if fast:
+        result, _ = relax_and_round(node_names, **data, log_output=log_output, budget=budget)
+        if result is None:
+            print("No solution found")
+        return result
 
-def get_docplex_barrier_loading_plan():
     # Create model
     mdl = Model("Wafer_Loading_Optimization")
-    solution, x = solve(mdl)
-
-    result = []
-    my_dict = {}
-    if solution:
-        for q in quarters:
-            my_dict = {}
-            for node in nodes:
-                my_dict[f'Node{node}'] = int(solution[x[node, q]])
-            result.append(my_dict)
-        return result
-    else:
+    solution, x = solve(mdl, **data, log_output=log_output, budget=budget, node_names=node_names)
+
+    if not solution:
         print("No solution found")
+        return None
+
+    with phase('docplex_barrier.extract'):
+        result = plan_from_solution(solution, x, node_names)
+    if budget is not None:
+        budget.incumbent(result, solution.objective_value)
+    return result
+
+class DocplexPlanner:
+    """Wafer loading model that is built once and re-solved with updated TAM and yield forecasts
+
+    Only the production coefficients, TAM bounds and initial loading bounds that
+    changed are written to the model, and each solve is warm-started from the
+    previous solution. Per-call timings are kept in `timings`. The keyword
+    arguments match scenario_data, so DocplexPlanner(**scenario_data(scenario))
+    plans a scenario; node_names maps each node number to its plan column.
+    """
+
+    def __init__(self, tam=TAM, yields=yield_dict, start_loading=initial_loading, gb_per_wafer=gb, tam_range=2,
+                 max_change=2500, node_names=None):
+        build_start = time.perf_counter()
+        self.nodes = sorted(start_loading)
+        self.quarters = list(range(len(tam)))
+        self.tam = list(tam)
+        self.yields = {node: list(yields[node]) for node in self.nodes}
+        self.start_loading = dict(start_loading)
+        self.gb_per_wafer = dict(gb_per_wafer)
+        self.tam_range = tam_range
+        self.node_names = node_names or {node: f'Node{node}' for node in self.nodes}
+        self.solution = None
+
+        self.mdl = Model("Wafer_Loading_Optimization")
+        self.x, self.production = build(self.mdl, self.tam, self.yields, self.start_loading, self.gb_per_wafer,
+                                        tam_range, max_change)
+        self.timings = {'build': time.perf_counter() - build_start}
+
+    def update(self, tam=None, yields=None, start_loading=None):
+        """Write only the changed forecast values into the model"""
+        if tam is not None:
+            for q in self.quarters:
+                if tam[q] != self.tam[q]:
+                    lower, upper = self.production[q]
+                    lower.rhs = (tam[q] - self.tam_range) * 1e9
+                    upper.rhs = (tam[q] + self.tam_range) * 1e9
+                    self.tam[q] = tam[q]
+
+        if yields is not None:
+            for node in self.nodes:
+                for q in self.quarters:
+                    if yields[node][q] != self.yields[node][q]:
+                        coefficient = 13 * self.gb_per_wafer[node] * yields[node][q]
+                        for constraint in self.production[q]:
+                            constraint.left_expr.set_coefficient(self.x[node, q], coefficient)
+                        self.yields[node][q] = yields[node][q]
+
+        if start_loading is not None:
+            for node in self.nodes:
+                value = start_loading[node]
+                if value != self.start_loading[node]:
+                    if value > self.start_loading[node]:
+                        self.x[node, 0].set_ub(value)
+                        self.x[node, 0].set_lb(value)
+                    else:
+                        self.x[node, 0].set_lb(value)
+                        self.x[node, 0].set_ub(value)
+                    self.start_loading[node] = value
+
+    def solve(self, tam=None, yields=None, start_loading=None, log_output=False):
+        """Re-solve with updated forecasts, warm-started from the previous solution"""
+        update_start = time.perf_counter()
+        self.update(tam, yields, start_loading)
+        self.timings['update'] = time.perf_counter() - update_start
+
+        # Warm start: the previous solution is offered to CPLEX as a MIP start
+        self.mdl.clear_mip_starts()
+        if self.solution is not None:
+            warm_start = self.mdl.new_solution()
+            for (node, q), var in self.x.items():
+                warm_start.add_var_value(var, self.start_loading[node] if q == 0 else self.solution[var])
+            self.mdl.add_mip_start(warm_start)
+
+        with phase('docplex_planner.solve'):
+            solve_start = time.perf_counter()
+            solution = self.mdl.solve(log_output=log_output)
+        self.timings['solve'] = time.perf_counter() - solve_start
+        if enabled():
+            record('docplex_planner', update_time=self.timings['update'], **solve_statistics(self.mdl, solution))
+
+        if not solution:
+            print("No solution found")
+            return None
+
+        self.solution = solution
+        return plan_from_solution(solution, self.x, self.node_names)
@@ -0,0 +1,110 @@
+import numpy as np
+from docplex.mp.model import Model
+
+from instrumentation import enabled, phase, record
+from plans import LoadingPlan, ToolSchedule
+
+from calculate_profits import (
+    QUARTERS,
+    NODES,
+    tam_base,
+    tam_range,
+    workstations,
+    initial_tool_count,
+    utilization,
+    capex_per_tool,
+    minute_load,
+    contribution_margin_per_gb,
+    wafer_gb,
+    initial_loading
+)
+
+quarters = list(range(QUARTERS))  # Q1'26 to Q4'27
+
+# Weekly available minutes per tool at each workstation
+available_minutes = {ws: 7 * 24 * 60 * utilization[ws] for ws in workstations}
+
+# Slack (in minutes) that keeps the tool count equal to the rounded-up requirement
+CEIL_TOLERANCE = 1e-4
+
+def build(mdl):
+    """Add the joint loading and tool model to mdl; returns x, tools and the revenue and CAPEX expressions ($M)"""
+    with phase('docplex_profit.build'):
+        # Decision variables: x[node,q] = weekly loading (number of wafers) for each node and quarter
+        x = mdl.integer_var_dict(((node, q) for node in NODES for q in quarters), lb=0, name="x")
+        # Tools needed and tools added at each workstation in each quarter
+        tools = mdl.integer_var_dict(((ws, q) for ws in workstations for q in quarters), lb=0, name="tools")
+        added = mdl.continuous_var_dict(((ws, q) for ws in workstations for q in quarters), lb=0, name="added")
+
+        # Fix initial loading for Q1'26
+        for node in NODES:
+            mdl.add_constraint(x[node, 0] == initial_loading[node])
+
+        # Enforce maximum change of ±2500 wafers between quarters
+        for node in NODES:
+            for q in range(1, len(quarters)):
+                mdl.add_constraint(x[node, q] - x[node, q-1] <= 2500)
+                mdl.add_constraint(x[node, q-1] - x[node, q] <= 2500)
+
+        # Production constraints: total production must lie within TAM ±2 billion GB
+        for q in quarters:
+            total_production = mdl.sum(x[node, q] * wafer_gb[q][i] for i, node in enumerate(NODES))
+            mdl.add_constraint(total_production >= (tam_base[q] - tam_range) * 1e9)
+            mdl.add_constraint(total_production <= (tam_base[q] + tam_range) * 1e9)
+
+        # Tools needed = ceil(minutes of load / available minutes per tool), as in calculate_profits
+        for ws in workstations:
+            for q in quarters:
+                load = mdl.sum(x[node, q] * minute_load[node][ws] for node in NODES if minute_load[node][ws] > 0)
+                mdl.add_constraint(tools[ws, q] * available_minutes[ws] >= load)
+                mdl.add_constraint((tools[ws, q] - 1) * available_minutes[ws] <= load - CEIL_TOLERANCE)
+
+                # CAPEX is paid on tools added over the previous quarter's requirement
+                prev_tools = initial_tool_count[ws] if q == 0 else tools[ws, q-1]
+                mdl.add_constraint(added[ws, q] >= tools[ws, q] - prev_tools)
+
+        # Net profit terms in millions USD (revenue from output minus CAPEX)
+        revenue = mdl.sum(x[node, q] * wafer_gb[q][i] * contribution_margin_per_gb / 1e6
+                          for i, node in enumerate(NODES) for q in quarters)
+        capex = mdl.sum(added[ws, q] * capex_per_tool[ws] for ws in workstations for q in quarters)
+    return x, tools, revenue, capex
+
+def solve(mdl, budget=None):
+    x, tools, revenue, capex = build(mdl)
+    # Objective: maximize net profit
+    mdl.maximize(revenue - capex)
+    if budget is not None:
+        from .docplex_barrier import apply_budget
+        apply_budget(mdl, budget, lambda solution: plan_from_solution(solution, x))
+
+    with phase('docplex_profit.solve'):
+        solution = mdl.solve(log_output=True)
+    if enabled():
+        from .docplex_barrier import solve_statistics
+        record('docplex_profit', **solve_statistics(mdl, solution))
+    return solution, x, tools
+
+def plan_from_solution(solution, x):
+    return LoadingPlan(np.rint(solution.get_values([x[node, q] for q in quarters for node in NODES]))
+                       .reshape(len(quarters), len(NODES)), NODES)
+
+def find_profit_optimal_loading(budget=None):
+    """Solve the joint loading and tool MILP, returning the plan, its tool schedule and net profit ($M)"""
+    mdl = Model("Wafer_Loading_Profit_Optimization")
+    solution, x, tools = solve(mdl, budget)
+
+    if not solution:
+        print("No solution found")
+        return None, None, None
+
+    with phase('docplex_profit.extract'):
+        loading_plan = plan_from_solution(solution, x)
+        tool_schedule = ToolSchedule(np.rint(solution.get_values([tools[ws, q] for q in quarters for ws in workstations]))
+                                     .reshape(len(quarters), len(workstations)), workstations)
+    return loading_plan, tool_schedule, solution.objective_value
+
+def get_docplex_profit_loading_plan(budget=None):
+    loading_plan, _, net_profit = find_profit_optimal_loading(budget)
+    if budget is not None and loading_plan is not None:
+        budget.incumbent(loading_plan, net_profit)
+    return loading_plan
@@ -0,0 +1,392 @@
+import numpy as np
+
+from instrumentation import count, phase
+from plans import LoadingPlan
+
+from .brute_force import (
+    QUARTERS,
+    NODES,
+    tam_base,
+    tam_range,
+    initial_loading,
+    wafer_gb,
+    reachable_bounds
+)
+
+# Maximum wafer change per node between consecutive quarters
+MAX_CHANGE = 2500
+
+# Upper bound on (states x neighbour offsets) evaluated in one NumPy block
+MAX_BLOCK_PAIRS = 4_000_000
+
+# Upper bound on the dense grid cells (float32) of the change transform; larger boxes are split into slabs
+MAX_GRID_CELLS = 50_000_000
+
+# Upper bounds checked before the forward pass: lattice states in any quarter (change objective)
+# and states x neighbour offsets over all quarters (profit objective)
+MAX_STATES = 8_000_000
+MAX_PROFIT_PAIRS = 3_000_000_000
+
+def lattice_origin(step):
+    """Offset of the loading lattice so that the initial loading lies on it"""
+    return np.array([initial_loading[node] % step for node in NODES])
+
+def lattice_rows(quarter, step, bounds=None):
+    """Lattice coordinates of every node but the last, with the range of last-node coordinates near the TAM band
+
+    Returns the head coordinates and, for each, the first last-node coordinate and
+    the number of coordinates to check; the range is one point wider on each side
+    than the band, so the counts are an upper bound on the states.
+    """
+    origin = lattice_origin(step)
+    start = np.array([initial_loading[node] for node in NODES])
+
+    # Loadings reachable from Q1 after `quarter` transitions, kept non-negative
+    low = np.maximum(start - MAX_CHANGE * quarter, 0)
+    high = start + MAX_CHANGE * quarter
+    if bounds is not None:
+        low = np.maximum(low, bounds[0][quarter])
+        high = np.minimum(high, bounds[1][quarter])
+    k_low = -((origin - low) // step)
+    k_high = (high - origin) // step
+
+    # Enumerate all nodes but the last, then solve the TAM band for the last node's range
+    axes = [np.arange(k_low[i], k_high[i] + 1) for i in range(len(NODES) - 1)]
+    head = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(NODES) - 1)
+    head_gb = (origin[:-1] + step * head) @ wafer_gb[quarter][:-1]
+
+    last_gb = wafer_gb[quarter][-1]
+    tam_min = (tam_base[quarter] - tam_range) * 1e9
+    tam_max = (tam_base[quarter] + tam_range) * 1e9
+    # Widen by one lattice point on each side; the exact band check in lattice_states trims it back
+    last_low = np.maximum(np.ceil(((tam_min - head_gb) / last_gb - origin[-1]) / step) - 1, k_low[-1])
+    last_high = np.minimum(np.floor(((tam_max - head_gb) / last_gb - origin[-1]) / step) + 1, k_high[-1])
+    counts = np.maximum(last_high - last_low + 1, 0).astype(np.int64)
+    return head, last_low.astype(np.int64), counts
+
+def lattice_states(quarter, step, bounds=None):
+    """Enumerate lattice coordinates of every loading reachable in a quarter with output inside the TAM band
+
+    bounds from brute_force.reachable_bounds also drop loadings from which a later TAM band cannot be met.
+    """
+    origin = lattice_origin(step)
+    head, last_low, counts = lattice_rows(quarter, step, bounds)
+
+    rows = np.repeat(np.arange(len(head)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    coords = np.column_stack([head[rows], last_low[rows] + offsets])
+
+    output = (origin + step * coords) @ wafer_gb[quarter] / 1e9
+    in_band = ((tam_base[quarter] - tam_range) <= output) & (output <= (tam_base[quarter] + tam_range))
+    return coords[in_band]
+
+def check_step(step, objective, bounds):
+    """Raise ValueError if the lattice for `step` is too large for the forward pass to finish"""
+    states = [int(lattice_rows(quarter, step, bounds)[2].sum()) for quarter in range(1, QUARTERS)]
+    if objective == 'change' and max(states) > MAX_STATES:
+        raise ValueError(f"Step {step} gives up to {max(states):,} states per quarter (limit {MAX_STATES:,}); "
+                         f"use a coarser step")
+    pairs = sum(states) * len(neighbour_offsets(step))
+    if objective == 'profit' and pairs > MAX_PROFIT_PAIRS:
+        raise ValueError(f"Step {step} gives {pairs:,} state and move pairs for the profit objective "
+                         f"(limit {MAX_PROFIT_PAIRS:,}); use a coarser step")
+
+def lattice_states_dims(step):
+    """Size of the lattice along each node axis over the whole horizon"""
+    origin = lattice_origin(step)
+    start = np.array([initial_loading[node] for node in NODES])
+    high = start + MAX_CHANGE * (QUARTERS - 1)
+    return (high - origin) // step + 1
+
+def neighbour_offsets(step):
+    """All lattice moves whose per-node wafer change stays within the transition limit"""
+    radius = MAX_CHANGE // step
+    axis = np.arange(-radius, radius + 1)
+    return np.stack(np.meshgrid(*([axis] * len(NODES)), indexing='ij'), axis=-1).reshape(-1, len(NODES))
+
+def profit_tables():
+    """Per-node minute loads, weekly available minutes and CAPEX per tool from calculate_profits"""
+    from calculate_profits import (
+        minute_load_matrix,
+        available_minutes,
+        capex_vector,
+        initial_tool_vector,
+        contribution_margin_per_gb
+    )
+
+    return minute_load_matrix, available_minutes, capex_vector, initial_tool_vector, contribution_margin_per_gb
+
+def tools_needed(loadings, loads, available_minutes):
+    """Tools needed per workstation for an array of loadings (rounded up like calculate_profits)"""
+    total_time = (loadings[:, :, None] * loads[None, :, :]).sum(axis=1)
+    return np.ceil(total_time / available_minutes).astype(np.int64)
+
+def axis_slice(values, start, stop, axis):
+    """Slice an array between start and stop along one axis"""
+    index = [slice(None)] * values.ndim
+    index[axis] = slice(start, stop)
+    return values[tuple(index)]
+
+def window_min(values, width, axis):
+    """Minimum over the window [i, i + width) along an axis, in O(n log width) with a doubling table"""
+    length = values.shape[axis]
+    pad_shape = list(values.shape)
+    pad_shape[axis] = width - 1
+    result = np.concatenate([values, np.full(pad_shape, np.inf, dtype=values.dtype)], axis=axis)
+
+    # After each pass result[i] holds the minimum over [i, i + span)
+    span = 1
+    while span * 2 <= width:
+        result = np.minimum(axis_slice(result, 0, -span, axis), axis_slice(result, span, None, axis))
+        span *= 2
+    return np.minimum(axis_slice(result, 0, length, axis), axis_slice(result, width - span, width - span + length, axis))
+
+def box_l1_transform(values, radius, step):
+    """Min-plus transform: min over per-axis moves of at most `radius` points of value + step * |move|_1
+
+    The transition limit and the L1 change cost are both separable across nodes,
+    so the transform is applied one axis at a time with sliding-window minima.
+    """
+    result = values
+    for axis in range(values.ndim):
+        shape = [1] * values.ndim
+        shape[axis] = values.shape[axis]
+        position = (step * np.arange(values.shape[axis])).astype(values.dtype).reshape(shape)
+
+        # Moving down: min over y in [x, x + radius] of f(y) + step * (y - x)
+        down = window_min(result + position, radius + 1, axis) - position
+        # Moving up: min over y in [x - radius, x] of f(y) + step * (x - y)
+        flipped = np.flip(result, axis=axis) + position
+        up = np.flip(window_min(flipped, radius + 1, axis) - position, axis=axis)
+        result = np.minimum(down, up)
+    return result
+
+def change_costs(prev_states, prev_cost, states, step, budget=None):
+    """Minimum cumulative wafer change for each state given the previous quarter's states
+
+    Returns None if a budget.Budget expires between slabs of the transform.
+    """
+    radius = MAX_CHANGE // step
+    # Dense grid over the region where previous states and current states can meet.
+    # Costs are integer wafer counts, so float32 holds them exactly.
+    low = np.maximum(prev_states.min(axis=0), states.min(axis=0)) - radius
+    high = np.minimum(prev_states.max(axis=0), states.max(axis=0)) + radius
+    if (low > high).any():
+        return np.full(len(states), np.inf)
+    return slab_change_costs(prev_states, prev_cost, states, low, high, step, budget)
+
+def slab_change_costs(prev_states, prev_cost, states, low, high, step, budget=None):
+    """change_costs over the box [low, high], split into slabs along its longest axis while its grid is too large
+
+    Each slab of states is transformed on a grid widened by the transition radius
+    on both sides, so it sees every previous state it can be reached from, and
+    slabs are split again along another axis if needed. Returns None if a
+    budget.Budget expires between slabs.
+    """
+    radius = MAX_CHANGE // step
+    cost = np.full(len(states), np.inf)
+    kept = ((prev_states >= low) & (prev_states <= high)).all(axis=1)
+    inside = ((states >= low) & (states <= high)).all(axis=1)
+    if not kept.any() or not inside.any():
+        return cost
+    prev_states, prev_cost = prev_states[kept], prev_cost[kept]
+
+    dims = high - low + 1
+    if np.prod(dims.astype(float)) <= MAX_GRID_CELLS:
+        grid = np.full(tuple(dims), np.inf, dtype=np.float32)
+        grid[tuple((prev_states - low).T)] = prev_cost
+        grid = box_l1_transform(grid, radius, step)
+        cost[inside] = grid[tuple((states[inside] - low).T)]
+        return cost
+
+    axis = int(np.argmax(dims))
+    if dims[axis] <= 2 * radius + 1:
+        raise ValueError(f"Step {step} is too fine for the change transform")
+    count('dynamic_programming.slabs')
+    # Slab width such that the slab and its halo fit in the grid limit (split again below otherwise)
+    width = max(int(MAX_GRID_CELLS // (np.prod(dims.astype(float)) / dims[axis])) - 2 * radius, 1)
+    for start in range(low[axis], high[axis] + 1, width):
+        if budget is not None and budget.expired():
+            return None
+        stop = min(start + width - 1, high[axis])
+        in_slab = inside & (states[:, axis] >= start) & (states[:, axis] <= stop)
+        if not in_slab.any():
+            continue
+        slab_low, slab_high = low.copy(), high.copy()
+        slab_low[axis] = max(start - radius, low[axis])
+        slab_high[axis] = min(stop + radius, high[axis])
+        slab_cost = slab_change_costs(prev_states, prev_cost, states[in_slab], slab_low, slab_high, step, budget)
+        if slab_cost is None:
+            return None
+        cost[in_slab] = slab_cost
+    return cost
+
+def profit_costs(prev_states, prev_cost, prev_tools, states, tools, revenue, capex, step, quarter, budget=None):
+    """Minimum cumulative (CAPEX - revenue) for each state given the previous quarter's states
+
+    Only the neighbour offsets that can land inside the previous quarter's TAM
+    band are searched: states are taken in order of the output their loading
+    would have had in that quarter, so each block needs a narrow band of offsets.
+    Returns None if a budget.Budget expires between blocks.
+    """
+    offsets = neighbour_offsets(step)
+    order = np.argsort(encode(prev_states, step))
+    sorted_keys = encode(prev_states[order], step)
+
+    # Many states share a tool vector, so CAPEX is tabulated once per pair of distinct tool vectors
+    prev_unique, prev_group = np.unique(prev_tools, axis=0, return_inverse=True)
+    unique, group = np.unique(tools, axis=0, return_inverse=True)
+    capex_table = np.empty((len(prev_unique), len(unique)))
+    for start in range(len(prev_unique)):
+        capex_table[start] = np.maximum(unique - prev_unique[start], 0) @ capex
+    prev_group = prev_group.ravel()[order]
+    group = group.ravel()
+
+    # A predecessor's output (state - offset) @ wafer_gb must lie in the previous TAM band,
+    # widened by 1 GB against rounding
+    prev_gb = wafer_gb[quarter - 1]
+    state_gb = (lattice_origin(step) + step * states) @ prev_gb
+    offset_gb = step * offsets @ prev_gb
+    offset_order = np.argsort(offset_gb)
+    offsets, offset_gb = offsets[offset_order], offset_gb[offset_order]
+    tam_min = (tam_base[quarter - 1] - tam_range) * 1e9 - 1
+    tam_max = (tam_base[quarter - 1] + tam_range) * 1e9 + 1
+
+    cost = np.full(len(states), np.inf)
+    sorted_cost = prev_cost[order]
+    by_output = np.argsort(state_gb)
+    start = 0
+    while start < len(states):
+        if budget is not None and budget.expired():
+            return None
+        # Shrink the block until its states and their band of offsets fit in MAX_BLOCK_PAIRS
+        block_size = max(1, MAX_BLOCK_PAIRS // len(offsets))
+        while True:
+            block = by_output[start:start + block_size]
+            first = np.searchsorted(offset_gb, state_gb[block[0]] - tam_max)
+            last = np.searchsorted(offset_gb, state_gb[block[-1]] - tam_min, side='right')
+            if block_size == 1 or len(block) * (last - first) <= MAX_BLOCK_PAIRS:
+                break
+            block_size = max(1, MAX_BLOCK_PAIRS // (last - first))
+        start += len(block)
+        if last == first:
+            continue
+
+        band = offsets[first:last]
+        keys = encode(states[block][:, None, :] - band[None, :, :], step)
+        position = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        valid = (keys >= 0) & (sorted_keys[position] == keys)
+
+        total = sorted_cost[position] + capex_table[prev_group[position], group[block][:, None]]
+        cost[block] = np.where(valid, total, np.inf).min(axis=1) - revenue[block]
+    return cost
+
+def encode(coords, step):
+    """Encode lattice coordinates as integers (coordinates outside the lattice map to -1)"""
+    dims = lattice_states_dims(step)
+    keys = np.zeros(coords.shape[:-1], dtype=np.int64)
+    inside = np.ones(coords.shape[:-1], dtype=bool)
+    for i, size in enumerate(dims):
+        inside &= (coords[..., i] >= 0) & (coords[..., i] < size)
+        keys = keys * size + coords[..., i]
+    return np.where(inside, keys, -1)
+
+def find_optimal_loading(step=500, objective='change', budget=None):
+    """Find the loading plan on the step-sized lattice with minimum total change or maximum net profit
+
+    A budget.Budget is checked before each quarter of the forward pass (and
+    between blocks of the profit pass); no plan exists until the pass
+    completes, so an expired budget returns (None, None).
+
+    The lattice grows with the cube of 1 / step, so a step whose lattice exceeds
+    MAX_STATES (change) or MAX_PROFIT_PAIRS (profit) raises ValueError before the
+    forward pass. That leaves steps down to 44 for the change objective (about
+    75 s at step 50 and 3 minutes at 44) and down to 230 for the profit
+    objective (about 75 s at step 250 and 2 minutes at 230).
+    """
+    if objective not in ('change', 'profit'):
+        raise ValueError(f"Unknown objective: {objective}")
+
+    origin = lattice_origin(step)
+    bounds = reachable_bounds()
+    if bounds is None:
+        print("No loading plan can meet every TAM band")
+        return None, None
+    check_step(step, objective, bounds)
+    if objective == 'profit':
+        loads, available_minutes, capex, initial_tools, margin = profit_tables()
+
+    # Q1 is fixed at the initial loading
+    states = np.array([[(initial_loading[node] - origin[i]) // step for i, node in enumerate(NODES)]])
+    cost = np.zeros(1)
+    all_states = [states]
+    all_costs = [cost]
+    all_tools = []
+    if objective == 'profit':
+        tools = tools_needed(origin + step * states, loads, available_minutes)
+        revenue = (origin + step * states) @ wafer_gb[0] * margin / 1e6
+        cost = np.maximum(tools - initial_tools, 0) @ capex - revenue
+        all_costs = [cost]
+        all_tools = [tools]
+
+    # Only the states of each quarter and their best cumulative cost are kept
+    with phase('dynamic_programming.forward'):
+        for quarter in range(1, QUARTERS):
+            if budget is not None and budget.expired():
+                print(f"Time limit reached at quarter {quarter + 1}")
+                return None, None
+            states = lattice_states(quarter, step, bounds)
+            if objective == 'change':
+                cost = change_costs(all_states[-1], all_costs[-1], states, step, budget)
+            else:
+                tools = tools_needed(origin + step * states, loads, available_minutes)
+                revenue = (origin + step * states) @ wafer_gb[quarter] * margin / 1e6
+                cost = profit_costs(all_states[-1], all_costs[-1], all_tools[-1], states, tools, revenue, capex, step,
+                                    quarter, budget)
+            if cost is None:
+                print(f"Time limit reached at quarter {quarter + 1}")
+                return None, None
+
+            count('dynamic_programming.states', len(states))
+
+            # Drop states that cannot be reached from the previous quarter
+            reachable = np.isfinite(cost)
+            if not reachable.any():
+                print(f"Could not find valid loading for quarter {quarter + 1}")
+                return None, None
+            all_states.append(states[reachable])
+            all_costs.append(cost[reachable])
+            if objective == 'profit':
+                all_tools.append(tools[reachable])
+
+    with phase('dynamic_programming.backtrack'):
+        # Walk back from the best final state, recovering each predecessor from the stored costs
+        index = int(np.argmin(all_costs[-1]))
+        best_value = float(all_costs[-1][index])
+        results = LoadingPlan.zeros(QUARTERS, NODES)
+        for quarter in range(QUARTERS - 1, -1, -1):
+            state = all_states[quarter][index]
+            results[quarter] = origin + step * state
+            if quarter == 0:
+                break
+
+            prev_states = all_states[quarter - 1]
+            moves = state - prev_states
+            total = all_costs[quarter - 1].copy()
+            if objective == 'change':
+                total += step * np.abs(moves).sum(axis=1)
+            else:
+                added = np.maximum(all_tools[quarter][index] - all_tools[quarter - 1], 0)
+                total += added @ capex
+            total[np.abs(moves).max(axis=1) > MAX_CHANGE // step] = np.inf
+            index = int(np.argmin(total))
+
+    if objective == 'profit':
+        best_value = -best_value
+    return results, best_value
+
+def get_dynamic_programming_loading_plan(step=500, objective='change', budget=None):
+    loading_plan, best_value = find_optimal_loading(step, objective, budget)
+    if budget is not None and loading_plan is not None:
+        budget.incumbent(loading_plan, best_value)
+    return loading_plan
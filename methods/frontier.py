@@ -0,0 +1,115 @@
+import time
+
+import numpy as np
+from docplex.mp.model import Model
+
+from calculate_profits import analyze_loading_plans
+from instrumentation import count, phase
+
+from .docplex_profit import NODES, build, plan_from_solution, quarters
+
+def build_frontier_model(mdl):
+    """Joint loading and tool model with the total wafer change as a second objective expression"""
+    x, tools, revenue, capex = build(mdl)
+    diff = mdl.continuous_var_dict(((node, q) for node in NODES for q in quarters[1:]), lb=0, name="diff")
+    for node in NODES:
+        for q in quarters[1:]:
+            mdl.add_constraint(diff[node, q] >= x[node, q] - x[node, q-1])
+            mdl.add_constraint(diff[node, q] >= x[node, q-1] - x[node, q])
+    return x, mdl.sum(diff.values()), revenue, capex
+
+def non_dominated(points):
+    """Points not dominated on (total change, CAPEX, revenue): lower change and CAPEX, higher revenue"""
+    keys = np.array([[p['total_change'], p['capex'], -p['revenue']] for p in points])
+    keep = []
+    for i, key in enumerate(keys):
+        dominated = ((keys <= key).all(axis=1) & (keys < key).any(axis=1)).any()
+        if not dominated:
+            keep.append(points[i])
+    return keep
+
+def frontier_point(plan, epsilon, elapsed):
+    """Frontier entry for a plan: its total change, revenue, CAPEX and net profit ($M)"""
+    analysis = analyze_loading_plans(plan.array[None])
+    return {
+        'plan': plan,
+        'total_change': int(np.abs(np.diff(plan.array, axis=0)).sum()),
+        'revenue': float(analysis['revenue'][0].sum() / 1e6),
+        'capex': float(analysis['total_capex'][0]),
+        'net_profit': float(analysis['net_profit'][0]),
+        'epsilon': float(epsilon),
+        'time': elapsed
+    }
+
+def pareto_frontier(n_points=10, log_output=False):
+    """Trade-off between plan stability and profit by the epsilon-constraint method
+
+    The model is built once. The end points are the minimum-change plan and the
+    profit-maximising plan; in between, profit is maximised subject to
+    total change <= epsilon for n_points values of epsilon. Only the bound is
+    changed between steps, and epsilon grows so each solve is warm-started
+    from the previous (still feasible) solution. Identical plans are reported
+    once and dominated ones are dropped. Returns points sorted by total change,
+    each with its plan, total change, revenue, CAPEX and net profit ($M), the
+    epsilon that produced it and the solve time in seconds. If the profit
+    maximisation finds no solution, only the minimum-change end point is returned.
+    """
+    mdl = Model("Wafer_Loading_Frontier")
+    with phase('frontier.build'):
+        x, change, revenue, capex = build_frontier_model(mdl)
+
+    # End points of the sweep
+    with phase('frontier.solve'):
+        mdl.minimize(change)
+        start = time.perf_counter()
+        stable = mdl.solve(log_output=log_output)
+        elapsed = time.perf_counter() - start
+        if not stable:
+            print("No solution found")
+            return []
+        mdl.maximize(revenue - capex)
+        mdl.add_mip_start(stable)
+        profitable = mdl.solve(log_output=log_output)
+
+    # The change variables only bound |x[q] - x[q-1]| from above, so the plan itself is measured
+    change_min = int(np.abs(np.diff(plan_from_solution(stable, x).array, axis=0)).sum())
+    if not profitable:
+        print("No profit-maximising solution found")
+        return [frontier_point(plan_from_solution(stable, x), change_min, elapsed)]
+    change_max = int(np.abs(np.diff(plan_from_solution(profitable, x).array, axis=0)).sum())
+    limit = mdl.add_constraint(change <= change_min, ctname="epsilon")
+
+    points = {}
+    previous = stable
+    for epsilon in np.linspace(change_min, change_max, n_points):
+        limit.rhs = float(epsilon)
+        mdl.clear_mip_starts()
+        mdl.add_mip_start(previous)
+        with phase('frontier.solve'):
+            start = time.perf_counter()
+            solution = mdl.solve(log_output=log_output)
+            elapsed = time.perf_counter() - start
+        count('frontier.solves')
+        if not solution:
+            continue
+        previous = solution
+
+        plan = plan_from_solution(solution, x)
+        key = plan.array.tobytes()
+        if key in points:
+            continue
+        points[key] = frontier_point(plan, epsilon, elapsed)
+
+    return sorted(non_dominated(list(points.values())), key=lambda point: point['total_change'])
+
+def print_frontier(points):
+    """Print the frontier as a table"""
+    print("\nPareto Frontier (wafer change vs profit):")
+    print("Change   Revenue($M)  CAPEX($M)  Net($M)  Time(s)")
+    print("-" * 50)
+    for point in points:
+        print(f"{point['total_change']:6d}   {point['revenue']:11.1f}  {point['capex']:9.1f}  "
+              f"{point['net_profit']:7.1f}  {point['time']:7.3f}")
+
+if __name__ == '__main__':
+    print_frontier(pareto_frontier())
@@ -0,0 +1,172 @@
+import numpy as np
+
+from calculate_profits import analyze_loading_plans, profit_tables, tam_base, tam_range
+from instrumentation import count, phase
+from plans import LoadingPlan, loading_array
+
+# Maximum wafer change per node between consecutive quarters
+MAX_CHANGE = 2500
+
+# Moves between budget checks and incumbent reports
+CHECK_INTERVAL = 1024
+
+class PlanState:
+    """Loading plan with its tool counts, output and net profit, updated incrementally
+
+    Changing one loading only touches that quarter's output and the tool counts
+    of the workstations the node uses, and only the CAPEX of that quarter and
+    the next depends on those tool counts, so a move is evaluated without
+    re-analysing the plan.
+    """
+
+    def __init__(self, loading_plan, scenario=None):
+        nodes, _, loads, available, capex_costs, initial_tools, wafer_gb, margin = profit_tables(scenario)
+        if scenario is None:
+            tam, band, max_change = tam_base, tam_range, MAX_CHANGE
+        else:
+            tam, band, max_change = scenario.tam, scenario.tam_range, scenario.max_change
+
+        self.nodes = list(nodes)
+        self.loadings = loading_array(loading_plan, nodes).astype(np.int64)
+        n_quarters = len(self.loadings)
+        self.loads = np.asarray(loads, dtype=float)
+        self.available = np.asarray(available, dtype=float)
+        self.capex_costs = np.asarray(capex_costs, dtype=float)
+        self.max_change = max_change
+        self.tam_low = np.asarray(tam[:n_quarters]) - band
+        self.tam_high = np.asarray(tam[:n_quarters]) + band
+        self.output_per_wafer = np.asarray(wafer_gb[:n_quarters]) / 1e9        # billions of GBs
+        self.revenue_per_wafer = np.asarray(wafer_gb[:n_quarters]) * margin / 1e6  # millions USD
+        # Workstations each node loads; a move of that node only changes their tool counts
+        self.workstations_of = [np.flatnonzero(self.loads[n] > 0) for n in range(len(self.nodes))]
+
+        analysis = analyze_loading_plans(self.loadings[None], scenario)
+        self.minutes = self.loadings @ self.loads
+        # Row 0 is the tool inventory before the first quarter, row q + 1 the tools of quarter q
+        self.tools = np.vstack([np.asarray(initial_tools)[None], analysis['tools_needed'][0]]).astype(float)
+        self.output = analysis['output'][0].copy()
+        self.profit = float(analysis['net_profit'][0])
+
+    def evaluate(self, quarter, node, change):
+        """Profit change ($M) and new tool counts of adding `change` weekly wafers of a node in a quarter
+
+        Returns None if the move leaves the TAM band, breaks a transition limit
+        or makes the loading negative.
+        """
+        loadings = self.loadings
+        new = loadings[quarter, node] + change
+        if new < 0:
+            return None
+        if quarter > 0 and abs(new - loadings[quarter - 1, node]) > self.max_change:
+            return None
+        if quarter + 1 < len(loadings) and abs(loadings[quarter + 1, node] - new) > self.max_change:
+            return None
+        output = self.output[quarter] + change * self.output_per_wafer[quarter, node]
+        if not self.tam_low[quarter] <= output <= self.tam_high[quarter]:
+            return None
+
+        ws = self.workstations_of[node]
+        tools = np.ceil((self.minutes[quarter, ws] + change * self.loads[node, ws]) / self.available[ws])
+        before, old = self.tools[quarter, ws], self.tools[quarter + 1, ws]
+        added = np.maximum(tools - before, 0) - np.maximum(old - before, 0)
+        if quarter + 2 < len(self.tools):
+            after = self.tools[quarter + 2, ws]
+            added += np.maximum(after - tools, 0) - np.maximum(after - old, 0)
+        return change * self.revenue_per_wafer[quarter, node] - added @ self.capex_costs[ws], tools
+
+    def apply(self, quarter, node, change, delta, tools):
+        """Apply a move evaluated by evaluate()"""
+        ws = self.workstations_of[node]
+        self.loadings[quarter, node] += change
+        self.minutes[quarter, ws] += change * self.loads[node, ws]
+        self.tools[quarter + 1, ws] = tools
+        self.output[quarter] += change * self.output_per_wafer[quarter, node]
+        self.profit += delta
+
+def improve_plan(loading_plan, scenario=None, n_moves=1_000_000, max_step=500, temperature=1.0, seed=None,
+                 batch_size=65536, budget=None):
+    """Improve a plan's net profit by simulated annealing over single (quarter, node) wafer moves
+
+    Each move adds or removes between 1 and max_step weekly wafers (log-uniformly)
+    on one node in one quarter after the first; moves that break the TAM band or
+    transition limits are rejected. A worse move is accepted with probability
+    exp(delta / T), with T falling geometrically from `temperature` ($M) to a
+    thousandth of it; temperature=0 is plain hill climbing. Returns the best
+    plan found and its net profit ($M).
+
+    With a budget.Budget, the starting plan and every later best plan are
+    reported as incumbents (checked every CHECK_INTERVAL moves), and the search
+    stops early when the budget's time runs out.
+    """
+    state = PlanState(loading_plan, scenario)
+    rng = np.random.default_rng(seed)
+    n_quarters, n_nodes = state.loadings.shape
+    best, best_profit = state.loadings.copy(), state.profit
+    if budget is not None:
+        budget.incumbent(LoadingPlan(best, state.nodes), float(best_profit))
+    if n_quarters < 2:
+        return LoadingPlan(best, state.nodes), best_profit
+
+    accepted = moves = 0
+    reported = best
+    with phase('local_search.search'):
+        for start in range(0, n_moves, batch_size):
+            # Random numbers are drawn in batches; the move loop itself stays in plain Python
+            size = min(batch_size, n_moves - start)
+            quarters = rng.integers(1, n_quarters, size)
+            nodes = rng.integers(0, n_nodes, size)
+            changes = np.rint(np.exp(rng.uniform(0, np.log(max_step), size))).astype(np.int64)
+            changes *= rng.choice([-1, 1], size)
+            if temperature > 0:
+                # Accepting when delta >= T log(u) is accepting with probability exp(delta / T)
+                temperatures = temperature * 1e-3 ** ((start + np.arange(size)) / n_moves)
+                thresholds = temperatures * np.log(rng.random(size))
+            else:
+                thresholds = np.zeros(size)
+
+            for quarter, node, change, threshold in zip(quarters.tolist(), nodes.tolist(), changes.tolist(),
+                                                        thresholds.tolist()):
+                if budget is not None and not moves % CHECK_INTERVAL:
+                    # `best` is replaced, never modified, so it is reported without a copy
+                    if best is not reported:
+                        budget.incumbent(LoadingPlan(best, state.nodes), float(best_profit))
+                        reported = best
+                    if budget.expired():
+                        break
+                moves += 1
+                move = state.evaluate(quarter, node, change)
+                if move is None or move[0] < threshold:
+                    continue
+                state.apply(quarter, node, change, *move)
+                accepted += 1
+                if state.profit > best_profit + 1e-9:
+                    best, best_profit = state.loadings.copy(), state.profit
+            if moves < start + size:
+                break
+    count('local_search.moves', moves)
+    count('local_search.accepted', accepted)
+
+    # The tracked profit is re-checked with a full analysis, which is what callers compare against
+    best_profit = float(analyze_loading_plans(best[None], scenario)['net_profit'][0])
+    if budget is not None and best is not reported:
+        budget.incumbent(LoadingPlan(best, state.nodes), best_profit)
+    return LoadingPlan(best, state.nodes), best_profit
+
+def get_local_search_loading_plan(start='naive', n_moves=200_000, max_step=500, temperature=1.0, seed=0,
+                                  scenario=None, budget=None):
+    """Improve the plan of another registered method (`start`) by local search
+
+    The starting method runs without the budget's callback, since its objective
+    is not net profit, but within the budget's time.
+    """
+    from budget import Budget
+    from . import get_method
+
+    params = {} if scenario is None else {'scenario': scenario}
+    if budget is not None:
+        params['budget'] = Budget(budget.remaining(), budget.mip_gap)
+    loading_plan = get_method(start)(**params)
+    if loading_plan is None:
+        return None
+    loading_plan, _ = improve_plan(loading_plan, scenario, n_moves, max_step, temperature, seed, budget=budget)
+    return loading_plan
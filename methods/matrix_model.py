@@ -0,0 +1,321 @@
+import time
+
+import numpy as np
+from scipy import sparse
+
+from instrumentation import enabled, phase, record
+from plans import LoadingPlan
+
+from .brute_force import (
+    NODES,
+    tam_base,
+    tam_range,
+    initial_loading,
+    wafer_gb
+)
+
+# Maximum wafer change per node between consecutive quarters
+MAX_CHANGE = 2500
+
+def build_wafer_change_model(tam, quarter_wafer_gb, start_loading, band=tam_range, integer=True,
+                             max_change=MAX_CHANGE):
+    """Build the minimum wafer change model in standard form straight from arrays
+
+    tam is in billions of GBs per quarter, quarter_wafer_gb is the (quarters x nodes)
+    GB output of one weekly wafer and start_loading is the fixed first-quarter loading.
+    Variables are the loadings x[q, n] followed by the absolute changes d[q, n] for
+    q >= 1; the model is: minimize c @ v subject to row_lb <= A @ v <= row_ub and
+    lb <= v <= ub.
+    """
+    tam = np.asarray(tam, dtype=float)
+    quarter_wafer_gb = np.asarray(quarter_wafer_gb, dtype=float)
+    n_quarters, n_nodes = quarter_wafer_gb.shape
+    n_loading = n_quarters * n_nodes
+    n_change = (n_quarters - 1) * n_nodes
+
+    x = np.arange(n_loading).reshape(n_quarters, n_nodes)
+    d = n_loading + np.arange(n_change).reshape(n_quarters - 1, n_nodes)
+    current, previous = x[1:].ravel(), x[:-1].ravel()
+    change = d.ravel()
+    ones = np.ones(n_change)
+
+    # Production: tam - band <= sum over nodes of x[q, n] * GB per wafer (in billions) <= tam + band
+    production_rows = np.repeat(np.arange(n_quarters), n_nodes)
+    production = (production_rows, x.ravel(), quarter_wafer_gb.ravel() / 1e9)
+
+    # Transition: -max_change <= x[q, n] - x[q-1, n] <= max_change
+    transition_rows = n_quarters + np.arange(n_change)
+    # Absolute change: d - (x[q] - x[q-1]) >= 0 and d + (x[q] - x[q-1]) >= 0
+    pos_rows = transition_rows + n_change
+    neg_rows = pos_rows + n_change
+
+    rows = np.concatenate([production[0],
+                           transition_rows, transition_rows,
+                           pos_rows, pos_rows, pos_rows,
+                           neg_rows, neg_rows, neg_rows])
+    cols = np.concatenate([production[1],
+                           current, previous,
+                           change, current, previous,
+                           change, current, previous])
+    data = np.concatenate([production[2],
+                           ones, -ones,
+                           ones, -ones, ones,
+                           ones, ones, -ones])
+    n_rows = n_quarters + 3 * n_change
+    A = sparse.csr_array((data, (rows, cols)), shape=(n_rows, n_loading + n_change))
+
+    row_lb = np.concatenate([tam - band, np.full(n_change, -max_change), np.zeros(2 * n_change)])
+    row_ub = np.concatenate([tam + band, np.full(n_change, max_change), np.full(2 * n_change, np.inf)])
+
+    # First-quarter loading is fixed through its bounds
+    lb = np.zeros(n_loading + n_change)
+    ub = np.full(n_loading + n_change, np.inf)
+    lb[x[0]] = ub[x[0]] = np.asarray(start_loading, dtype=float)
+
+    c = np.concatenate([np.zeros(n_loading), np.ones(n_change)])
+    integrality = np.concatenate([np.full(n_loading, int(integer)), np.zeros(n_change, dtype=int)])
+
+    return {
+        'c': c,
+        'A': A,
+        'row_lb': row_lb,
+        'row_ub': row_ub,
+        'lb': lb,
+        'ub': ub,
+        'integrality': integrality,
+        'n_quarters': n_quarters,
+        'n_nodes': n_nodes
+    }
+
+def start_values(model, loadings):
+    """Variable vector for a (quarters x nodes) loading plan, used to warm-start a solve"""
+    loadings = np.asarray(loadings, dtype=float).reshape(model['n_quarters'], model['n_nodes'])
+    return np.concatenate([loadings.ravel(), np.abs(np.diff(loadings, axis=0)).ravel()])
+
+def solve_highs(model, time_limit=None, start=None, budget=None):
+    """Solve the model with scipy.optimize.milp (HiGHS); returns the variable values or None
+
+    scipy's milp takes no starting point, so `start` is accepted for a uniform
+    backend interface and ignored. A budget.Budget sets the time limit and MIP gap.
+    """
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    options = {} if time_limit is None else {'time_limit': time_limit}
+    if budget is not None:
+        if budget.time_limit is not None:
+            options['time_limit'] = min(options.get('time_limit', np.inf), budget.remaining())
+        if budget.mip_gap is not None:
+            options['mip_rel_gap'] = budget.mip_gap
+    with phase('matrix_model.solve'):
+        result = milp(model['c'],
+                      constraints=LinearConstraint(model['A'], model['row_lb'], model['row_ub']),
+                      bounds=Bounds(model['lb'], model['ub']),
+                      integrality=model['integrality'],
+                      options=options)
+    if enabled():
+        record('matrix_model', backend='highs', status=result.message, objective=result.fun,
+               nodes_processed=getattr(result, 'mip_node_count', None), mip_gap=getattr(result, 'mip_gap', None),
+               dual_bound=getattr(result, 'mip_dual_bound', None))
+    if result.x is None:
+        print(f"No solution found: {result.message}")
+        return None
+    return result.x
+
+def row_terms(model, variables):
+    """Yield (row index, [(variable, coefficient), ...]) for every row of the constraint matrix"""
+    A = model['A']
+    for row in range(A.shape[0]):
+        start, end = A.indptr[row], A.indptr[row + 1]
+        yield row, [(variables[col], coef) for col, coef in zip(A.indices[start:end], A.data[start:end])]
+
+def build_pulp(model):
+    """Load the model into a PuLP problem; returns the problem and its variables"""
+    import pulp
+
+    prob = pulp.LpProblem("Minimize_Wafer_Change", pulp.LpMinimize)
+    variables = [
+        pulp.LpVariable(f"v_{i}", lowBound=lb, upBound=None if np.isinf(ub) else ub,
+                        cat="Integer" if integer else "Continuous")
+        for i, (lb, ub, integer) in enumerate(zip(model['lb'], model['ub'], model['integrality']))
+    ]
+    prob += pulp.LpAffineExpression([(var, coef) for var, coef in zip(variables, model['c']) if coef != 0])
+
+    for row, terms in row_terms(model, variables):
+        expr = pulp.LpAffineExpression(terms)
+        row_lb, row_ub = model['row_lb'][row], model['row_ub'][row]
+        if np.isfinite(row_lb):
+            prob += expr >= row_lb, f"R{row}_lb"
+        if np.isfinite(row_ub):
+            prob += expr <= row_ub, f"R{row}_ub"
+    return prob, variables
+
+def solve_pulp(model, solver=None, start=None, budget=None):
+    """Load the model into PuLP and solve it with CBC; returns the variable values or None
+
+    `start` (a full variable vector) is passed to CBC as a warm start and a
+    budget.Budget sets CBC's time limit and relative gap.
+    """
+    import pulp
+
+    with phase('matrix_model.load'):
+        prob, variables = build_pulp(model)
+    if start is not None:
+        for var, value in zip(variables, start):
+            var.setInitialValue(value)
+    if solver is None and (start is not None or budget is not None):
+        solver = pulp.PULP_CBC_CMD(msg=False, warmStart=start is not None,
+                                   timeLimit=None if budget is None else budget.remaining(),
+                                   gapRel=None if budget is None else budget.mip_gap)
+    with phase('matrix_model.solve'):
+        prob.solve(solver)
+    if enabled():
+        record('matrix_model', backend='pulp', status=pulp.LpStatus[prob.status], objective=pulp.value(prob.objective),
+               solver_time=prob.solutionTime)
+    if prob.status != pulp.LpStatusOptimal:
+        print(f"No solution found: {pulp.LpStatus[prob.status]}")
+        return None
+    return np.array([var.value() for var in variables])
+
+def build_cplex(model):
+    """Load the model into the CPLEX engine (used by docplex) through its array interface"""
+    import cplex
+
+    cpx = cplex.Cplex()
+    cpx.objective.set_sense(cpx.objective.sense.minimize)
+    cpx.variables.add(obj=model['c'].tolist(),
+                      lb=model['lb'].tolist(),
+                      ub=np.where(np.isinf(model['ub']), cplex.infinity, model['ub']).tolist(),
+                      types=''.join('I' if integer else 'C' for integer in model['integrality']))
+
+    # Rows with both bounds become CPLEX range rows (row_lb <= a @ v <= row_lb + range)
+    A = model['A']
+    two_sided = np.isfinite(model['row_ub'])
+    lin_expr = [[A.indices[A.indptr[row]:A.indptr[row + 1]].tolist(), A.data[A.indptr[row]:A.indptr[row + 1]].tolist()]
+                for row in range(A.shape[0])]
+    cpx.linear_constraints.add(lin_expr=lin_expr,
+                               senses=''.join('R' if both else 'G' for both in two_sided),
+                               rhs=model['row_lb'].tolist(),
+                               range_values=np.where(two_sided, model['row_ub'] - model['row_lb'], 0.0).tolist())
+    return cpx
+
+def solve_cplex(model, log_output=False, start=None, budget=None):
+    """Load the model into CPLEX and solve it; returns the variable values or None
+
+    `start` (a full variable vector) is added as a MIP start that CPLEX repairs
+    if it has become infeasible, and a budget.Budget sets the time limit and MIP gap.
+    """
+    import cplex
+
+    with phase('matrix_model.load'):
+        cpx = build_cplex(model)
+        if start is not None and model['integrality'].any():
+            cpx.MIP_starts.add(cplex.SparsePair(ind=list(range(len(start))), val=np.asarray(start, dtype=float).tolist()),
+                               cpx.MIP_starts.effort_level.repair)
+    if budget is not None:
+        if budget.time_limit is not None:
+            cpx.parameters.timelimit.set(budget.remaining())
+        if budget.mip_gap is not None:
+            cpx.parameters.mip.tolerances.mipgap.set(budget.mip_gap)
+    if not log_output:
+        cpx.set_log_stream(None)
+        cpx.set_results_stream(None)
+    with phase('matrix_model.solve'):
+        cpx.solve()
+    if enabled():
+        record('matrix_model', backend='cplex', status=cpx.solution.get_status_string(),
+               iterations=cpx.solution.progress.get_num_iterations(),
+               nodes_processed=cpx.solution.progress.get_num_nodes_processed(),
+               mip_gap=cpx.solution.MIP.get_mip_relative_gap() if model['integrality'].any() else None)
+    if not cpx.solution.is_primal_feasible():
+        print(f"No solution found: {cpx.solution.get_status_string()}")
+        return None
+    return np.array(cpx.solution.get_values())
+
+BACKENDS = {
+    'highs': solve_highs,
+    'pulp': solve_pulp,
+    'cplex': solve_cplex
+}
+
+def plan_from_solution(model, values, node_names=NODES):
+    """Convert solved variable values into a LoadingPlan"""
+    n_quarters, n_nodes = model['n_quarters'], model['n_nodes']
+    return LoadingPlan(np.rint(values[:n_quarters * n_nodes]).reshape(n_quarters, n_nodes), node_names)
+
+def get_matrix_model_loading_plan(backend='highs', integer=True, scenario=None, budget=None):
+    """Minimum wafer change plan from the array-built model; with a budget only the final plan is reported"""
+    with phase('matrix_model.build'):
+        if scenario is None:
+            model = build_wafer_change_model(tam_base, wafer_gb, [initial_loading[node] for node in NODES],
+                                             integer=integer)
+            node_names = NODES
+        else:
+            model = build_wafer_change_model(scenario.tam, scenario.wafer_gb, scenario.initial_loading,
+                                             band=scenario.tam_range, integer=integer, max_change=scenario.max_change)
+            node_names = scenario.nodes
+
+    values = BACKENDS[backend](model, budget=budget)
+    if values is None:
+        return None
+    with phase('matrix_model.extract'):
+        plan = plan_from_solution(model, values, node_names)
+    if budget is not None:
+        budget.incumbent(plan, float(model['c'] @ values))
+    return plan
+
+def synthetic_instance(n_quarters, n_nodes, seed=0):
+    """Random feasible instance: yields ramping towards 0.98 and TAM taken from a random walk of loadings"""
+    rng = np.random.default_rng(seed)
+    gb_per_wafer = rng.uniform(50000, 300000, n_nodes)
+    ramp_start = rng.uniform(0.2, 0.98, n_nodes)
+    ramp = np.minimum(ramp_start + np.arange(n_quarters)[:, None] * rng.uniform(0.01, 0.1, n_nodes), 0.98)
+    quarter_wafer_gb = 13 * gb_per_wafer * ramp
+
+    loadings = np.cumsum(rng.integers(-500, 1000, (n_quarters, n_nodes)), axis=0) + rng.integers(2000, 10000, n_nodes)
+    loadings = np.maximum(loadings, 0)
+    tam = (loadings * quarter_wafer_gb).sum(axis=1) / 1e9
+    return tam, quarter_wafer_gb, loadings[0]
+
+def measure_build_times(n_quarters=104, n_nodes=50, repeats=3):
+    """Best-of-`repeats` build time (seconds) of the array builder, pulp_simplex.build and docplex_barrier.build"""
+    from docplex.mp.model import Model
+    import pulp
+
+    from . import docplex_barrier, pulp_simplex
+
+    tam, quarter_wafer_gb, start_loading = synthetic_instance(n_quarters, n_nodes)
+    # The expression builders take GB per wafer and yields separately; one GB per wafer and yields of
+    # quarter_wafer_gb / 13 give the same production coefficients
+    nodes = range(n_nodes)
+    unit_gb = {n: 1 for n in nodes}
+    builders = {
+        'matrix': lambda: build_wafer_change_model(tam, quarter_wafer_gb, start_loading),
+        'matrix + pulp load': lambda: build_pulp(build_wafer_change_model(tam, quarter_wafer_gb, start_loading)),
+        'matrix + cplex load': lambda: build_cplex(build_wafer_change_model(tam, quarter_wafer_gb, start_loading)),
+        'pulp_simplex.build': lambda: pulp_simplex.build(
+            pulp.LpProblem("Minimize_Wafer_Change", pulp.LpMinimize),
+            tam={q + 1: tam[q] * 1e9 for q in range(n_quarters)},
+            yields={q + 1: {n: quarter_wafer_gb[q, n] / 13 for n in nodes} for q in range(n_quarters)},
+            start_loading={n: start_loading[n] for n in nodes}, gb_per_wafer=unit_gb, max_change=MAX_CHANGE),
+        'docplex_barrier.build': lambda: docplex_barrier.build(
+            Model("Wafer_Loading_Optimization"), tam=list(tam),
+            yields={n: list(quarter_wafer_gb[:, n] / 13) for n in nodes},
+            start_loading={n: start_loading[n] for n in nodes}, gb_per_wafer=unit_gb, tam_range=tam_range,
+            max_change=MAX_CHANGE)
+    }
+
+    timings = {}
+    for name, build in builders.items():
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            build()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    return timings
+
+if __name__ == '__main__':
+    for n_quarters, n_nodes in [(104, 50), (208, 100)]:
+        print(f"\nBuild time for {n_quarters} quarters x {n_nodes} nodes:")
+        for name, seconds in measure_build_times(n_quarters, n_nodes).items():
+            print(f"{name:22} {seconds * 1000:10.1f} ms")
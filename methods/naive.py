@@ -1,106 +1,129 @@
-import numpy as np
-
-# Constants from the problem
-QUARTERS = 8  # Q1'26 to Q4'27
-WEEKS_PER_QUARTER = 13
-
-# TAM data (billions of GBs)
-tam_base = np.array([21.8, 27.4, 34.9, 39.0, 44.7, 51.5, 52.5, 53.5])
-tam_range = 2.0  # ±2 billion GBs
-
-# Product specifications
-gb_per_wafer = {
-    'Node1': 100000,  # 100k
-    'Node2': 150000,  # 150k
-    'Node3': 270000   # 270k
-}
-
-# Yield data
-yields = {
-    'Node1': [0.98, 0.98, 0.98, 0.98, 0.98, 0.98, 0.98, 0.98],
-    'Node2': [0.60, 0.82, 0.95, 0.98, 0.98, 0.98, 0.98, 0.98],
-    'Node3': [0.20, 0.25, 0.35, 0.50, 0.65, 0.85, 0.95, 0.98]
-}
-
-# Initial conditions for Q1'26
-initial_loading = {
-    'Node1': 12000,
-    'Node2': 5000,
-    'Node3': 1000
-}
-
-def calculate_quarterly_output(loading, quarter):
+from math import ceil
+
+from instrumentation import count
+from plans import LoadingPlan
+
+# Competition data (Q1'26 to Q4'27; TAM in billions of GBs)
+from calculate_profits import (
+    QUARTERS,
+    WEEKS_PER_QUARTER,
+    tam_base,
+    tam_range,
+    gb_per_wafer,
+    yields,
+    initial_loading
+)
+
+def calculate_quarterly_output(loading, quarter, scenario=None):
     """Calculate total GB output for a given quarter's loading"""
+    if scenario is not None:
+        return sum(loading[node] * scenario.wafer_gb[quarter][i] for i, node in enumerate(scenario.nodes)) / 1e9
+
     output = 0
     output += loading['Node1'] * WEEKS_PER_QUARTER * gb_per_wafer['Node1'] * yields['Node1'][quarter]
     output += loading['Node2'] * WEEKS_PER_QUARTER * gb_per_wafer['Node2'] * yields['Node2'][quarter]
     output += loading['Node3'] * WEEKS_PER_QUARTER * gb_per_wafer['Node3'] * yields['Node3'][quarter]
     return output / 1e9  # Convert to billions of GBs
 
-def get_node_efficiency(quarter):
+def get_node_efficiency(quarter, scenario=None):
     """Calculate and sort nodes by their GB output efficiency (GB per wafer * yield)"""
     efficiencies = []
-    for node in ['Node1', 'Node2', 'Node3']:
-        efficiency = gb_per_wafer[node] * yields[node][quarter]
-        efficiencies.append((node, efficiency))
+    if scenario is not None:
+        for i, node in enumerate(scenario.nodes):
+            efficiencies.append((node, scenario.gb_per_wafer[i] * scenario.yields[quarter][i]))
+    else:
+        for node in ['Node1', 'Node2', 'Node3']:
+            efficiency = gb_per_wafer[node] * yields[node][quarter]
+            efficiencies.append((node, efficiency))
     
     # Sort by efficiency in descending order
     return sorted(efficiencies, key=lambda x: x[1], reverse=True)
 
-def adjust_loading_for_tam(prev_loading, quarter):
-    """Adjust loading based on TAM deficit and node efficiency"""
+def adjust_loading_for_tam(prev_loading, quarter, scenario=None, current_loading=None):
+    """Adjust loading based on TAM deficit and node efficiency
+
+    Each node's change is computed in closed form from its wafer contribution,
+    so a quarter takes one step per node instead of one step per wafer.
+    The new loading is written to current_loading (e.g. the next quarter of a
+    LoadingPlan) or to a copy of prev_loading. Returns the new loading and the
+    number of allocation steps taken.
+    """
     # First, calculate output with previous loading
-    current_loading = prev_loading.copy()
-    current_output = calculate_quarterly_output(current_loading, quarter)
+    if current_loading is None:
+        current_loading = prev_loading.copy()
+    else:
+        current_loading.update(prev_loading)
+    current_output = calculate_quarterly_output(current_loading, quarter, scenario)
     
     # Calculate TAM deficit (positive means we need more output)
-    tam_target = tam_base[quarter]
+    if scenario is None:
+        tam_target, band, max_change = tam_base[quarter], tam_range, 2500
+    else:
+        tam_target, band, max_change = scenario.tam[quarter], scenario.tam_range, scenario.max_change
     tam_deficit = tam_target - current_output
     
     # Get nodes sorted by efficiency
-    node_efficiencies = get_node_efficiency(quarter)
-    
-    # Adjust loading based on deficit
-    while abs(tam_deficit) > tam_range:
-        adjustment_made = False
-        
-        for node, efficiency in node_efficiencies:
-            # Calculate how much one wafer of this node contributes to output
-            wafer_contribution = (gb_per_wafer[node] * yields[node][quarter] * WEEKS_PER_QUARTER) / 1e9
-            
-            if tam_deficit > 0:  # Need to increase output
-                # Check if we can increase this node's loading
-                if current_loading[node] < prev_loading[node] + 2500:
-                    # Increase by up to 1 wafers
-                    increase = min(1, int((tam_deficit / wafer_contribution) + 0.5))
-                    increase = min(increase, prev_loading[node] + 2500 - current_loading[node])
-                    if increase > 0:
-                        current_loading[node] += increase
-                        current_output = calculate_quarterly_output(current_loading, quarter)
-                        tam_deficit = tam_target - current_output
-                        adjustment_made = True
-                        break
-        
-        if not adjustment_made:
+    node_efficiencies = get_node_efficiency(quarter, scenario)
+    if scenario is not None:
+        node_index = {node: i for i, node in enumerate(scenario.nodes)}
+
+    iterations = 0
+    for node, efficiency in node_efficiencies:
+        if abs(tam_deficit) <= band:
             break
+        iterations += 1
+
+        # Calculate how much one wafer of this node contributes to output
+        if scenario is None:
+            wafer_contribution = (gb_per_wafer[node] * yields[node][quarter] * WEEKS_PER_QUARTER) / 1e9
+        else:
+            wafer_contribution = scenario.wafer_gb[quarter][node_index[node]] / 1e9
+        if wafer_contribution <= 0:
+            continue
+
+        # Fewest wafers that bring the output back inside the TAM range
+        wafers_needed = ceil((abs(tam_deficit) - band) / wafer_contribution)
+
+        if tam_deficit > 0:  # Need to increase output
+            headroom = prev_loading[node] + max_change - current_loading[node]
+            change = min(wafers_needed, headroom)
+        else:  # Need to decrease output
+            headroom = current_loading[node] - max(0, prev_loading[node] - max_change)
+            change = -min(wafers_needed, headroom)
+
+        if change != 0:
+            # Only this node changed, so the output moves by its contribution instead of being recomputed
+            current_loading[node] += change
+            current_output += change * wafer_contribution
+            tam_deficit = tam_target - current_output
     
-    return current_loading
+    return current_loading, iterations
+
+def find_loading_plan(scenario=None, budget=None):
+    """Find loading plan for all quarters using TAM deficit method
 
-def find_loading_plan():
-    """Find loading plan for all quarters using TAM deficit method"""
+    Returns the plan and the number of allocation steps taken in each quarter;
+    the plan is None if a budget.Budget runs out first.
+    """
     # Initialize results with the first quarter's known values
-    results = [{
-        'Node1': initial_loading['Node1'],
-        'Node2': initial_loading['Node2'],
-        'Node3': initial_loading['Node3']
-    }]
+    if scenario is None:
+        results = LoadingPlan.zeros(QUARTERS, ['Node1', 'Node2', 'Node3'])
+        results[0] = initial_loading
+    else:
+        results = LoadingPlan.zeros(scenario.n_quarters, scenario.nodes)
+        results[0] = scenario.initial_loading
+    iterations = [0]
     
-    # For each subsequent quarter
-    for quarter in range(1, QUARTERS):
-        new_loading = adjust_loading_for_tam(results[-1], quarter)
-        results.append(new_loading)
+    # For each subsequent quarter, adjusted in place in the plan's array
+    for quarter in range(1, len(results)):
+        if budget is not None and budget.expired():
+            print(f"Time limit reached at quarter {quarter + 1}")
+            return None, iterations
+        _, quarter_iterations = adjust_loading_for_tam(results[quarter - 1], quarter, scenario, results[quarter])
+        iterations.append(quarter_iterations)
+    count('naive.allocation_steps', sum(iterations))
     
-    return results
+    return results, iterations
 
 def print_loading_plan(loading_plan):
     """Print the loading plan in a formatted table"""
@@ -116,7 +139,9 @@ def print_loading_plan(loading_plan):
         print(f"    {loading['Node1']:5d}   {loading['Node2']:5d}   {loading['Node3']:5d}   ",
               f"{output:11.1f}   [{tam_min:.1f}, {tam_max:.1f}]")
 
-def get_naive_loading_plan():
+def get_naive_loading_plan(scenario=None, budget=None):
     # Find and print solution
-    loading_plan = find_loading_plan()
+    loading_plan, _ = find_loading_plan(scenario, budget)
+    if budget is not None and loading_plan is not None:
+        budget.incumbent(loading_plan)
     return loading_plan
\ No newline at end of file
@@ -1,48 +1,40 @@
 import pulp
 
+import calculate_profits as cp
+from instrumentation import enabled, phase, record
+from plans import LoadingPlan
+
 # Define the quarters and nodes
-quarters = [1, 2, 3, 4, 5, 6, 7, 8]
+quarters = list(range(1, cp.QUARTERS + 1))
 nodes = [1, 2, 3]
 
+# The competition data from calculate_profits, keyed by quarter and node numbered from 1
 # Initial weekly loading for Q1'26 (given)
-initial_loading = {1: {1: 12000, 2: 5000, 3: 1000}}
+initial_loading = {1: {n: cp.initial_loading[f'Node{n}'] for n in nodes}}
 
 # Yield data for each node and quarter (from Table 2)
-yield_data = {
-    1: {1: 0.98, 2: 0.60, 3: 0.20},  # Q1'26
-    2: {1: 0.98, 2: 0.82, 3: 0.25},  # Q2'26
-    3: {1: 0.98, 2: 0.95, 3: 0.35},  # Q3'26
-    4: {1: 0.98, 2: 0.98, 3: 0.50},  # Q4'26
-    5: {1: 0.98, 2: 0.98, 3: 0.65},  # Q1'27
-    6: {1: 0.98, 2: 0.98, 3: 0.85},  # Q2'27
-    7: {1: 0.98, 2: 0.98, 3: 0.95},  # Q3'27
-    8: {1: 0.98, 2: 0.98, 3: 0.98}   # Q4'27
-}
+yield_data = {q: {n: cp.yields[f'Node{n}'][q - 1] for n in nodes} for q in quarters}
 
 # GB per wafer for each node
-GB_per_wafer = {1: 100000, 2: 150000, 3: 270000}
-
-# TAM for each quarter (in billions, convert to GB by multiplying by 1e9)
-TAM = {
-    1: 21.8e9,
-    2: 27.4e9,
-    3: 34.9e9,
-    4: 39.0e9,
-    5: 44.7e9,
-    6: 51.5e9,
-    7: 52.5e9,
-    8: 53.5e9,
-}
-
-def solve(prob):
+GB_per_wafer = {n: cp.gb_per_wafer[f'Node{n}'] for n in nodes}
+
+# TAM for each quarter (in billions, converted to GB)
+TAM = {q: cp.tam_base[q - 1] * 1e9 for q in quarters}
+
+def build(prob, tam=TAM, yields=yield_data, start_loading=initial_loading[1], gb_per_wafer=GB_per_wafer,
+          max_change=2500):
+    """Add the minimum wafer change LP to prob; returns the loadings L[q][n] (constants for Q1)"""
     # Decision variables: L[q][n] for each quarter and node.
     # For Q1, values are fixed. For Q2-Q8, define as continuous variables (could be set as integer if needed).
+    # Quarters (numbered from 1) and nodes follow the keys of the TAM and initial loading data.
+    quarters = sorted(tam)
+    nodes = sorted(start_loading)
     L = {}
     for q in quarters:
         L[q] = {}
         for n in nodes:
             if q == 1:
-                L[q][n] = initial_loading[1][n]
+                L[q][n] = start_loading[n]
             else:
                 L[q][n] = pulp.LpVariable(f"L_{q}_{n}", lowBound=0, cat="Continuous")
 
@@ -62,40 +54,94 @@ def solve(prob):
     for q in quarters:
         if q == 1:
             continue  # Skip Q1 as loading is fixed.
-        production = 13 * (
-            L[q][1] * GB_per_wafer[1] * yield_data[q][1] +
-            L[q][2] * GB_per_wafer[2] * yield_data[q][2] +
-            L[q][3] * GB_per_wafer[3] * yield_data[q][3]
-        )
-        prob += production == TAM[q], f"Production_Q{q}"
-
-    # Loading change constraints: For q>=2, the change in loading cannot exceed 2500 wafers.
+        production = 13 * pulp.lpSum(L[q][n] * gb_per_wafer[n] * yields[q][n] for n in nodes)
+        prob += production == tam[q], f"Production_Q{q}"
+
+    # Loading change constraints: For q>=2, the change in loading cannot exceed 2500 wafers (max_change).
     for q in quarters:
         if q == 1:
             continue
         for n in nodes:
-            prob += L[q][n] - L[q-1][n] <= 2500, f"Increase_Q{q}_Node{n}"
-            prob += L[q-1][n] - L[q][n] <= 2500, f"Decrease_Q{q}_Node{n}"
+            prob += L[q][n] - L[q-1][n] <= max_change, f"Increase_Q{q}_Node{n}"
+            prob += L[q-1][n] - L[q][n] <= max_change, f"Decrease_Q{q}_Node{n}"
             # Link the auxiliary variable to the absolute difference
             prob += d[q][n] >= L[q][n] - L[q-1][n], f"Abs_Pos_Q{q}_Node{n}"
             prob += d[q][n] >= L[q-1][n] - L[q][n], f"Abs_Neg_Q{q}_Node{n}"
 
+    return L
+
+def solve(prob, tam=TAM, yields=yield_data, start_loading=initial_loading[1], solver=None, gb_per_wafer=GB_per_wafer,
+          max_change=2500):
+    with phase('pulp_simplex.build'):
+        L = build(prob, tam, yields, start_loading, gb_per_wafer, max_change)
+
     # Solve the optimization problem
-    prob.solve()
+    with phase('pulp_simplex.solve'):
+        prob.solve(solver)
+    if enabled():
+        record('pulp_simplex', status=pulp.LpStatus[prob.status], objective=pulp.value(prob.objective),
+               solver_time=prob.solutionTime, variables=len(prob.variables()), constraints=len(prob.constraints))
 
     return L
 
-def get_pulp_simplex_loading_plan():
+def scenario_data(scenario):
+    """Convert a scenario.Scenario into the keyword arguments of solve (quarters and nodes numbered from 1)"""
+    scenario_quarters = range(1, scenario.n_quarters + 1)
+    scenario_nodes = range(1, scenario.n_nodes + 1)
+    return {
+        'tam': {q: scenario.tam[q - 1] * 1e9 for q in scenario_quarters},
+        'yields': {q: {n: scenario.yields[q - 1][n - 1] for n in scenario_nodes} for q in scenario_quarters},
+        'start_loading': {n: int(scenario.initial_loading[n - 1]) for n in scenario_nodes},
+        'gb_per_wafer': {n: scenario.gb_per_wafer[n - 1] for n in scenario_nodes},
+        'max_change': scenario.max_change
+    }
+
+def get_pulp_simplex_loading_plan(scenario=None, budget=None, return_model=False):
+    """Minimum-change loading plan from the LP, or None if CBC finds no optimal solution
+
+    With return_model=True, returns (plan, prob) so the solved problem can be passed
+    to sensitivity(); prob is returned even when the plan is None.
+    """
     # Create the LP problem (minimization)
     prob = pulp.LpProblem("Minimize_Wafer_Change", pulp.LpMinimize)
-    L = solve(prob)
+    # A budget.Budget becomes CBC's time limit (the model is a pure LP, so there is no gap
+    # to set); CBC runs as a subprocess, so only the final plan is reported as an incumbent
+    solver = None if budget is None else pulp.PULP_CBC_CMD(msg=False, timeLimit=budget.remaining())
+    if scenario is None:
+        L = solve(prob, solver=solver)
+        node_names = [f'Node{n}' for n in nodes]
+    else:
+        L = solve(prob, **scenario_data(scenario), solver=solver)
+        node_names = scenario.nodes
 
-    result = []
-    my_dict = {}
-    for q in quarters:
-        my_dict = {}
-        for i, n in enumerate(nodes, start=1):
-            my_dict[f'Node{i}'] = int(pulp.value(L[q][n]))
-        result.append(my_dict)
+    # CBC stopped by its time limit reports status Optimal with whatever point it
+    # had reached; for an LP only an optimal solution is a plan
+    if prob.status != pulp.LpStatusOptimal or prob.sol_status != pulp.LpSolutionOptimal:
+        status = pulp.LpStatus[prob.status] if prob.status != pulp.LpStatusOptimal else 'stopped before optimality'
+        print(f"No solution found: {status}")
+        return (None, prob) if return_model else None
+
+    with phase('pulp_simplex.extract'):
+        result = LoadingPlan.zeros(len(L), node_names)
+        for row, q in enumerate(sorted(L)):
+            for i, n in enumerate(sorted(L[q])):
+                result.array[row, i] = int(pulp.value(L[q][n]))
+
+    if budget is not None:
+        budget.incumbent(result, pulp.value(prob.objective))
+    return (result, prob) if return_model else result
+
+def sensitivity(prob):
+    """Shadow prices and slacks of the Production, Increase and Decrease constraints and reduced costs of a solved LP
 
-    return result
\ No newline at end of file
+    Production duals are per GB of TAM. CBC reports no RHS ranging; see
+    methods.sensitivity for ranges and what-if answers.
+    """
+    rows = {name: constraint for name, constraint in prob.constraints.items()
+            if name.startswith(('Production_', 'Increase_', 'Decrease_'))}
+    return {
+        'objective': pulp.value(prob.objective),
+        'shadow_prices': {name: constraint.pi for name, constraint in rows.items()},
+        'slacks': {name: constraint.slack for name, constraint in rows.items()},
+        'reduced_costs': {var.name: var.dj for var in prob.variables()}
+    }
@@ -0,0 +1,83 @@
+import numpy as np
+
+from instrumentation import phase
+from calculate_profits import analyze_loading_plans
+from plans import LoadingPlan, loading_array
+from scenario import ARRAYS, SCALARS, Scenario, default_scenario
+
+from .matrix_model import BACKENDS, build_wafer_change_model, plan_from_solution, start_values
+
+def remaining_scenario(scenario, actual_loadings, actual_yields=None):
+    """Scenario of the last completed quarter followed by the quarters still to plan
+
+    actual_loadings holds the realised loadings of the completed quarters and
+    actual_yields (completed quarters x nodes) replaces their forecast yields.
+    Each node's forecast yields for the remaining quarters are scaled by its
+    realised / forecast yield in the last completed quarter (capped at a yield of
+    1), so a node running behind its ramp is planned to stay behind it. The last completed
+    loading becomes the fixed first quarter and the tools it needs become the
+    initial tool inventory, so CAPEX is only charged on tools added from now on.
+    """
+    actual = loading_array(actual_loadings, scenario.nodes)
+    completed = len(actual)
+    if not 1 <= completed <= scenario.n_quarters:
+        raise ValueError(f"Expected 1 to {scenario.n_quarters} completed quarters, got {completed}")
+
+    yields = np.array(scenario.yields, dtype=float)
+    if actual_yields is not None:
+        realised = np.asarray(actual_yields, dtype=float).reshape(completed, scenario.n_nodes)
+        forecast = yields[completed - 1]
+        ratio = np.divide(realised[-1], forecast, out=np.ones_like(forecast), where=forecast > 0)
+        yields[completed:] = np.minimum(yields[completed:] * ratio, 1.0)
+        yields[:completed] = realised
+
+    values = {name: getattr(scenario, name) for name in ARRAYS}
+    values.update({name: getattr(scenario, name) for name in SCALARS})
+    values['yields'] = yields[completed - 1:]
+    values['initial_loading'] = actual[-1]
+    values['initial_tools'] = analyze_loading_plans(actual[None], scenario)['tools_needed'][0, -1]
+
+    # The completed quarter's output is already realised, so its TAM row is centred on it
+    # instead of being a constraint an off-forecast quarter could violate
+    values['tam'] = np.array(scenario.tam[completed - 1:], dtype=float)
+    remaining = Scenario(scenario.nodes, scenario.workstations, **values)
+    remaining.tam[0] = actual[-1] @ remaining.wafer_gb[0] / 1e9
+    return remaining
+
+def replan(previous_plan, actual_loadings, actual_yields=None, scenario=None, backend='cplex', analyze=False):
+    """Re-solve the minimum wafer change plan for the quarters after the completed ones
+
+    Only the remaining horizon is modelled, so a replan gets cheaper as quarters
+    are locked in. The remaining quarters of previous_plan warm-start the solve
+    (CPLEX and CBC; HiGHS starts cold). Returns the completed quarters followed by
+    the new plan, or None if the remaining horizon is infeasible.
+
+    With analyze=True, (plan, analysis) is returned instead, where analysis is
+    calculate_profits.analyze_loading_plans of the last completed quarter and
+    the new quarters against the tool inventory that quarter needs, so CAPEX
+    only counts tools added from now on (None if there is no plan).
+    """
+    if scenario is None:
+        scenario = default_scenario()
+
+    with phase('rolling_horizon.build'):
+        remaining = remaining_scenario(scenario, actual_loadings, actual_yields)
+        completed = scenario.n_quarters - remaining.n_quarters + 1
+        model = build_wafer_change_model(remaining.tam, remaining.wafer_gb, remaining.initial_loading,
+                                         band=remaining.tam_range, max_change=remaining.max_change)
+
+        start = None
+        if previous_plan is not None:
+            guess = loading_array(previous_plan, scenario.nodes)[completed - 1:].astype(float)
+            guess[0] = remaining.initial_loading
+            start = start_values(model, guess)
+
+    values = BACKENDS[backend](model, start=start)
+    if values is None:
+        return (None, None) if analyze else None
+
+    plan = plan_from_solution(model, values, scenario.nodes)
+    result = LoadingPlan(np.concatenate([loading_array(actual_loadings, scenario.nodes), plan.array[1:]]), scenario.nodes)
+    if analyze:
+        return result, analyze_loading_plans(plan.array[None], remaining)
+    return result
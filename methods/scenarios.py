@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from plans import LoadingPlan
+
+METHODS = ['docplex', 'pulp']
+
+# Solver instance owned by the current worker process (set up by init_worker)
+worker_state = {}
+
+def init_worker(method, threads, started=None):
+    """Create this worker's solver instance, capped at `threads` solver threads
+
+    The index of each scenario the worker starts is put on `started`, if given.
+    """
+    worker_state['method'] = method
+    worker_state['started'] = started
+    if method == 'docplex':
+        from .docplex_barrier import DocplexPlanner
+        planner = DocplexPlanner()
+        planner.mdl.parameters.threads = threads
+        worker_state['planner'] = planner
+    else:
+        import pulp
+        worker_state['solver'] = pulp.PULP_CBC_CMD(msg=False, threads=threads)
+
+def solve_docplex_scenario(scenario):
+    """Re-solve the worker's docplex planner with the scenario's forecasts"""
+    planner = worker_state['planner']
+    plan = planner.solve(
+        tam=scenario['tam'],
+        yields={int(node[4:]): list(values) for node, values in scenario['yields'].items()},
+        start_loading={int(node[4:]): value for node, value in scenario['initial_loading'].items()}
+    )
+    status = planner.mdl.solve_details.status
+    objective = planner.mdl.objective_value if plan is not None else None
+    return plan, status, objective
+
+def solve_pulp_scenario(scenario):
+    """Build and solve the PuLP LP for the scenario's forecasts"""
+    import pulp
+    from .pulp_simplex import quarters, nodes, solve
+
+    prob = pulp.LpProblem("Minimize_Wafer_Change", pulp.LpMinimize)
+    L = solve(
+        prob,
+        tam={q: scenario['tam'][q - 1] * 1e9 for q in quarters},
+        yields={q: {n: scenario['yields'][f'Node{n}'][q - 1] for n in nodes} for q in quarters},
+        start_loading={n: scenario['initial_loading'][f'Node{n}'] for n in nodes},
+        solver=worker_state['solver']
+    )
+    status = pulp.LpStatus[prob.status]
+    if prob.status != pulp.LpStatusOptimal:
+        return None, status, None
+
+    plan = LoadingPlan.zeros(len(quarters), [f'Node{n}' for n in nodes])
+    for row, q in enumerate(quarters):
+        for i, n in enumerate(nodes):
+            plan.array[row, i] = int(pulp.value(L[q][n]))
+    return plan, status, pulp.value(prob.objective)
+
+def solve_scenario(index, scenario):
+    """Solve one scenario in a worker; errors are reported in the result instead of raised"""
+    start = time.perf_counter()
+    if worker_state.get('started') is not None:
+        worker_state['started'].put(index)
+    try:
+        if worker_state['method'] == 'docplex':
+            plan, status, objective = solve_docplex_scenario(scenario)
+        else:
+            plan, status, objective = solve_pulp_scenario(scenario)
+        error = None
+    except Exception as exc:
+        plan, status, objective, error = None, 'error', None, repr(exc)
+
+    return {
+        'index': index,
+        'name': scenario.get('name', index),
+        'status': status,
+        'plan': plan,
+        'objective': objective,
+        'error': error,
+        'solve_time': time.perf_counter() - start
+    }
+
+def error_result(index, scenario, exc):
+    """Result of a scenario whose worker process failed (e.g. it was killed)"""
+    return {
+        'index': index,
+        'name': scenario.get('name', index),
+        'status': 'error',
+        'plan': None,
+        'objective': None,
+        'error': repr(exc),
+        'solve_time': None
+    }
+
+def run_pool(scenarios, indices, method, max_workers, threads, crashes):
+    """Solve scenarios[indices] in a new process pool, yielding results as they finish
+
+    If a worker dies, the pool is broken and every unfinished scenario fails
+    with BrokenProcessPool; those are not yielded. Returns the unfinished
+    indices and the ones among them a worker had started, keeping the last
+    BrokenProcessPool of each in `crashes`.
+    """
+    started = multiprocessing.SimpleQueue()
+    finished = set()
+    with ProcessPoolExecutor(max_workers, initializer=init_worker, initargs=(method, threads, started)) as pool:
+        futures = {pool.submit(solve_scenario, index, scenarios[index]): index for index in indices}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool as exc:
+                crashes[index] = exc
+                continue
+            except Exception as exc:
+                result = error_result(index, scenarios[index], exc)
+            finished.add(index)
+            yield result
+
+    running = set()
+    while not started.empty():
+        running.add(started.get())
+    unfinished = [index for index in indices if index not in finished]
+    return unfinished, [index for index in unfinished if index in running]
+
+def solve_scenarios(scenarios, method='docplex', max_workers=None, threads=1):
+    """Solve a batch of forecast scenarios across a process pool, yielding results as they finish
+
+    Each scenario is a dict with 'tam' (8 quarterly values in billions of GBs),
+    'yields' ({'Node1': [8 yields], ...}), 'initial_loading' ({'Node1': wafers, ...})
+    and an optional 'name'. Every worker keeps one solver instance limited to
+    `threads` threads; by default there are as many workers as fit in the CPU count.
+    Failed or infeasible scenarios come back with plan None and their status.
+
+    If a worker process dies, the pool is recreated and the scenarios that had
+    not started are resubmitted. The ones that were running are retried one at
+    a time in a single-worker pool, so only a scenario that crashes its worker
+    on its own comes back with status 'error'.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    scenarios = list(scenarios)
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // threads)
+
+    pending = list(range(len(scenarios)))
+    suspects = []
+    crashes = {}
+    while pending or suspects:
+        if pending:
+            unfinished, running = yield from run_pool(scenarios, pending, method, max_workers, threads, crashes)
+            # A worker that died before starting a scenario (e.g. while reading it) leaves no trace,
+            # so every unfinished scenario is a suspect
+            running = running or unfinished
+            pending = [index for index in unfinished if index not in running]
+            suspects.extend(running)
+        else:
+            index = suspects.pop(0)
+            unfinished, _ = yield from run_pool(scenarios, [index], method, 1, threads, crashes)
+            if unfinished:
+                yield error_result(index, scenarios[index], crashes[index])
@@ -0,0 +1,201 @@
+import os
+import tempfile
+
+import cplex
+import pulp
+
+from instrumentation import count, phase
+
+class WhatIf:
+    """Sensitivity report of a wafer change LP, answering what-if questions from its duals
+
+    cpx is a CPLEX problem with rows named as in pulp_simplex (Production_Q*,
+    Increase_Q*_Node*, ...); it is solved as an LP. production maps each quarter
+    (numbered from 1) to the names of its production rows, loading maps
+    (node, quarter) to the name of the loading variable, yields maps
+    (node, quarter) to the forecast yield and quarter_gb maps each node to
+    the GB a fully yielding weekly wafer produces in a quarter.
+
+    After construction, shadow_prices, slacks and rhs_ranges are keyed by row
+    name and reduced_costs and values by variable name.
+    """
+
+    def __init__(self, cpx, production, loading, yields, quarter_gb):
+        self.cpx = cpx
+        self.production = production
+        self.loading = loading
+        self.yields = yields
+        self.quarter_gb = quarter_gb
+
+        cpx.set_problem_type(cpx.problem_type.LP)
+        cpx.set_log_stream(None)
+        cpx.set_results_stream(None)
+        with phase('sensitivity.solve'):
+            cpx.solve()
+        if cpx.solution.get_status() != cpx.solution.status.optimal:
+            raise ValueError(f"LP not solved to optimality: {cpx.solution.get_status_string()}")
+
+        rows = cpx.linear_constraints.get_names()
+        variables = cpx.variables.get_names()
+        self.objective = cpx.solution.get_objective_value()
+        self.rhs = dict(zip(rows, cpx.linear_constraints.get_rhs()))
+        self.shadow_prices = dict(zip(rows, cpx.solution.get_dual_values()))
+        self.slacks = dict(zip(rows, cpx.solution.get_linear_slacks()))
+        self.rhs_ranges = dict(zip(rows, cpx.solution.sensitivity.rhs()))
+        self.reduced_costs = dict(zip(variables, cpx.solution.get_reduced_costs()))
+        self.values = dict(zip(variables, cpx.solution.get_values()))
+
+    def coefficient_changes(self, yields):
+        """{(row, variable): change} of the production coefficients for {(node, quarter): yield change}"""
+        return {(row, self.loading[node, quarter]): self.quarter_gb[node] * change
+                for (node, quarter), change in yields.items()
+                for row in self.production[quarter]}
+
+    def rhs_changes(self, tam=None, yields=None):
+        """Right-hand side changes equivalent to the perturbation, or None if it changes the optimal basis
+
+        A TAM change (billions of GB) moves the production rows of its quarter.
+        A yield change of a loading at zero keeps the basis optimal as long as
+        its reduced cost stays non-negative; on a positive loading it acts, to
+        first order, like removing the change in that loading's output from the
+        right-hand side.
+        """
+        changes = {}
+        for quarter, change in (tam or {}).items():
+            for row in self.production[quarter]:
+                changes[row] = changes.get(row, 0.0) + change * 1e9
+
+        reduced_costs = {}
+        for (row, var), change in self.coefficient_changes(yields or {}).items():
+            value = self.values[var]
+            if value > 1e-9:
+                changes[row] = changes.get(row, 0.0) - change * value
+            else:
+                reduced_costs[var] = reduced_costs.get(var, self.reduced_costs[var]) - self.shadow_prices[row] * change
+        if any(reduced_cost < -1e-9 for reduced_cost in reduced_costs.values()):
+            return None
+        return changes
+
+    def within_ranges(self, changes):
+        """100% rule: the basis stays optimal if the changes use at most all of their ranges together"""
+        used = 0.0
+        for row, change in changes.items():
+            low, high = self.rhs_ranges[row]
+            allowed = high - self.rhs[row] if change > 0 else self.rhs[row] - low
+            if change != 0:
+                if allowed <= 0:
+                    return False
+                used += abs(change) / allowed
+        return used <= 1 + 1e-9
+
+    def what_if(self, tam=None, yields=None, resolve=False):
+        """Minimum total wafer change after changing TAM ({quarter: billions of GB}) and yields ({(node, quarter): change})
+
+        Within the ranging limits the answer is the objective plus the shadow
+        prices times the right-hand side changes ('method': 'dual'), which is
+        exact for TAM changes and first order for yield changes. Otherwise, or
+        with resolve=True, the changes are written into the LP, re-solved with
+        dual simplex from the current basis and undone ('method': 'resolve');
+        that answer includes the loadings, keyed like `loading`.
+        """
+        changes = None if resolve else self.rhs_changes(tam, yields)
+        if changes is not None and self.within_ranges(changes):
+            count('sensitivity.dual')
+            return {
+                'objective': self.objective + sum(self.shadow_prices[row] * change for row, change in changes.items()),
+                'method': 'dual',
+                'exact': not yields
+            }
+        return self.resolve(tam, yields)
+
+    def resolve(self, tam=None, yields=None):
+        """Re-solve the LP with the changes applied, then restore it"""
+        cpx = self.cpx
+        rhs = {}
+        for quarter, change in (tam or {}).items():
+            for row in self.production[quarter]:
+                rhs[row] = rhs.get(row, self.rhs[row]) + change * 1e9
+        coefficients = self.coefficient_changes(yields or {})
+        original = dict(zip(coefficients, cpx.linear_constraints.get_coefficients(list(coefficients))))
+
+        if rhs:
+            cpx.linear_constraints.set_rhs(list(rhs.items()))
+        if coefficients:
+            cpx.linear_constraints.set_coefficients([(row, var, original[row, var] + change)
+                                                     for (row, var), change in coefficients.items()])
+        cpx.parameters.lpmethod.set(cpx.parameters.lpmethod.values.dual)
+        with phase('sensitivity.resolve'):
+            cpx.solve()
+        count('sensitivity.resolve')
+
+        result = {'objective': None, 'method': 'resolve', 'exact': True,
+                  'iterations': cpx.solution.progress.get_num_iterations()}
+        if cpx.solution.get_status() == cpx.solution.status.optimal:
+            result['objective'] = cpx.solution.get_objective_value()
+            names = list(self.loading.values())
+            result['loading'] = dict(zip(self.loading, cpx.solution.get_values(names)))
+
+        if rhs:
+            cpx.linear_constraints.set_rhs([(row, self.rhs[row]) for row in rhs])
+        if coefficients:
+            cpx.linear_constraints.set_coefficients([(row, var, value) for (row, var), value in original.items()])
+        return result
+
+    def ramp_delay(self, node, delay=1):
+        """Yield changes for a node whose yield ramp happens `delay` quarters later"""
+        quarters = sorted(quarter for n, quarter in self.yields if n == node)
+        return {(node, quarter): self.yields[node, quarters[max(i - delay, 0)]] - self.yields[node, quarter]
+                for i, quarter in enumerate(quarters)
+                if (node, quarter) in self.loading}
+
+def pulp_what_if(scenario=None):
+    """WhatIf for the pulp_simplex LP (production equal to TAM), solved by CPLEX through PuLP"""
+    from .pulp_simplex import GB_per_wafer, initial_loading, scenario_data, solve, yield_data
+
+    prob = pulp.LpProblem("Minimize_Wafer_Change", pulp.LpMinimize)
+    data = {} if scenario is None else scenario_data(scenario)
+    with phase('sensitivity.build'):
+        L = solve(prob, solver=pulp.CPLEX_PY(msg=False), **data)
+    yields = data.get('yields', yield_data)
+    gb_per_wafer = data.get('gb_per_wafer', GB_per_wafer)
+    quarters = sorted(L)
+    nodes = sorted(data.get('start_loading', initial_loading[1]))
+    return WhatIf(prob.solverModel,
+                  production={q: [f"Production_Q{q}"] for q in quarters[1:]},
+                  loading={(n, q): L[q][n].name for q in quarters[1:] for n in nodes},
+                  yields={(n, q): yields[q][n] for q in quarters for n in nodes},
+                  quarter_gb={n: 13 * gb_per_wafer[n] for n in nodes})
+
+def docplex_what_if(planner=None):
+    """WhatIf for the LP relaxation of a DocplexPlanner model (production within the TAM band)"""
+    from .docplex_barrier import DocplexPlanner
+
+    if planner is None:
+        planner = DocplexPlanner()
+    # The relaxation is read back from the exported model so the planner's own engine is left untouched
+    with phase('sensitivity.build'), tempfile.TemporaryDirectory() as directory:
+        cpx = cplex.Cplex(planner.mdl.export_as_lp(os.path.join(directory, 'model.lp')))
+    quarters, nodes = planner.quarters, planner.nodes
+    return WhatIf(cpx,
+                  production={q + 1: [f"Production_Min_Q{q+1}", f"Production_Max_Q{q+1}"] for q in quarters},
+                  loading={(node, q + 1): planner.x[node, q].name for node in nodes for q in quarters[1:]},
+                  yields={(node, q + 1): planner.yields[node][q] for node in nodes for q in quarters},
+                  quarter_gb={node: 13 * planner.gb_per_wafer[node] for node in nodes})
+
+def print_sensitivity(what_if, tolerance=1e-12):
+    """Print the binding Production, Increase and Decrease rows with their shadow prices and RHS ranges"""
+    print("\nShadow prices (wafer change per unit of right-hand side):")
+    print(f"{'Constraint':22} {'Dual':>12} {'RHS':>14} {'Range':>32}")
+    print("-" * 83)
+    for row, dual in what_if.shadow_prices.items():
+        if abs(dual) <= tolerance or not row.startswith(('Production_', 'Increase_', 'Decrease_')):
+            continue
+        low, high = what_if.rhs_ranges[row]
+        print(f"{row:22} {dual:12.4g} {what_if.rhs[row]:14.6g} {low:15.6g} .. {high:<14.6g}")
+
+if __name__ == '__main__':
+    what_if = pulp_what_if()
+    print_sensitivity(what_if)
+    print(f"\nMinimum total change: {what_if.objective:.1f}")
+    print(f"Q6 TAM +1B GB: {what_if.what_if(tam={6: 1.0})}")
+    print(f"Node3 ramps one quarter later: {what_if.what_if(yields=what_if.ramp_delay(3))}")
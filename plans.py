@@ -0,0 +1,152 @@
+
+# loading plans
+from collections.abc import Mapping, MutableMapping
+
+import numpy as np
+
+class QuarterView(MutableMapping):
+    """Dict-like view of one quarter of a plan; reads and writes go to the plan's array"""
+
+    __slots__ = ('values', 'index')
+
+    def __init__(self, values, index):
+        self.values = values  # 1-d row view into the plan's array
+        self.index = index    # column name -> position, shared by every quarter of a plan
+
+    def __getitem__(self, key):
+        return int(self.values[self.index[key]])
+
+    def __setitem__(self, key, value):
+        self.values[self.index[key]] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Columns cannot be removed from a plan")
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __eq__(self, other):
+        if isinstance(other, QuarterView):
+            return self.index.keys() == other.index.keys() and bool((self.values == other.values).all())
+        if isinstance(other, Mapping):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    def copy(self):
+        """A detached dict, like dict.copy()"""
+        return dict(zip(self.index, self.values.tolist()))
+
+    def __repr__(self):
+        return repr(self.copy())
+
+class QuarterTable:
+    """Integer (quarters x columns) table stored in one contiguous NumPy array
+
+    Indexing a quarter returns a QuarterView that behaves like the
+    {'Node1': ..., 'Node2': ...} dicts used before, without copying; slicing
+    returns a table sharing the same memory.
+    """
+
+    __slots__ = ('array', 'columns', 'index')
+
+    def __init__(self, array, columns):
+        self.array = np.ascontiguousarray(array, dtype=np.int64)
+        self.columns = list(columns)
+        self.index = {name: i for i, name in enumerate(self.columns)}
+        if self.array.ndim != 2 or self.array.shape[1] != len(self.columns):
+            raise ValueError(f"Expected a (quarters x {len(self.columns)}) array, got shape {self.array.shape}")
+
+    @classmethod
+    def zeros(cls, n_quarters, columns):
+        return cls(np.zeros((n_quarters, len(columns)), dtype=np.int64), columns)
+
+    @classmethod
+    def from_dicts(cls, quarters, columns=None):
+        """Build a table from a list of {column: value} dicts (columns default to the first dict's keys)"""
+        if isinstance(quarters, cls):
+            return quarters
+        quarters = list(quarters)
+        if columns is None:
+            columns = list(quarters[0])
+        return cls(np.rint([[quarter[name] for name in columns] for quarter in quarters]), columns)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            table = object.__new__(type(self))
+            table.array, table.columns, table.index = self.array[item], self.columns, self.index
+            return table
+        return QuarterView(self.array[item], self.index)
+
+    def __setitem__(self, quarter, values):
+        if isinstance(values, Mapping):
+            values = [values[name] for name in self.columns]
+        self.array[quarter] = values
+
+    def __iter__(self):
+        for row in self.array:
+            yield QuarterView(row, self.index)
+
+    def __array__(self, dtype=None, copy=None):
+        # copy=None shares the array when no conversion is needed; copy=True never does
+        if dtype is None or np.dtype(dtype) == self.array.dtype:
+            return self.array.copy() if copy else self.array
+        return self.array.astype(dtype, copy=bool(copy))
+
+    def __eq__(self, other):
+        if isinstance(other, QuarterTable):
+            return self.columns == other.columns and np.array_equal(self.array, other.array)
+        if isinstance(other, (list, tuple)):
+            return len(other) == len(self) and all(view == quarter for view, quarter in zip(self, other))
+        return NotImplemented
+
+    def column(self, name):
+        """All quarters of one column, as a view"""
+        return self.array[:, self.index[name]]
+
+    def to_dicts(self):
+        return [dict(zip(self.columns, row)) for row in self.array.tolist()]
+
+    def copy(self):
+        return type(self)(self.array.copy(), self.columns)
+
+    def __getstate__(self):
+        return self.array, self.columns
+
+    def __setstate__(self, state):
+        self.array, self.columns = state
+        self.index = {name: i for i, name in enumerate(self.columns)}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dicts()!r})"
+
+class LoadingPlan(QuarterTable):
+    """Weekly wafer loading per quarter and node"""
+
+    __slots__ = ()
+
+    @property
+    def nodes(self):
+        return self.columns
+
+class ToolSchedule(QuarterTable):
+    """Tool count per quarter and workstation"""
+
+    __slots__ = ()
+
+    @property
+    def workstations(self):
+        return self.columns
+
+def loading_array(loading_plan, nodes):
+    """(quarters x nodes) array of a LoadingPlan or array (without copying) or of a list of loading dicts"""
+    if isinstance(loading_plan, QuarterTable) and loading_plan.columns == list(nodes):
+        return loading_plan.array
+    if isinstance(loading_plan, np.ndarray):
+        return loading_plan.reshape(len(loading_plan), len(nodes))
+    return np.array([[loading[node] for node in nodes] for loading in loading_plan])
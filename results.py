@@ -1,24 +1,116 @@
-from methods import (
-    get_docplex_barrier_loading_plan,
-    get_brute_force_loading_plan,
-    get_naive_loading_plan,
-    get_pulp_simplex_loading_plan
-)
-from calculate_profits import run_analysis
-
-docplex_loading_plan = get_docplex_barrier_loading_plan()
-brute_force_loading_plan = get_brute_force_loading_plan()
-naive_loading_plan = get_naive_loading_plan()
-pulp_simplex_loading_plan = get_pulp_simplex_loading_plan()
-
-print('### Docplex ###')
-run_analysis(docplex_loading_plan)
-
-print('### Pulp ###')
-run_analysis(pulp_simplex_loading_plan)
-
-print('### Naive ###')
-run_analysis(naive_loading_plan)
-
-print('### Brute Force ###')
-run_analysis(brute_force_loading_plan)
+import argparse
+import ast
+import contextlib
+import inspect
+
+from methods import METHODS, get_method
+from calculate_profits import analyze_loading_plan, print_analysis
+from instrumentation import phase, tracing
+
+# Methods run when none are named on the command line
+DEFAULT_METHODS = ['docplex_barrier', 'pulp_simplex', 'naive', 'brute_force']
+
+# Plans and analyses are reused from here until an input or the planning code changes
+DEFAULT_CACHE = '.plan_cache'
+
+def solve_and_analyze(name, params, scenario=None, cache=None):
+    """Run a method and analyze its plan, returning (plan, (quarterly results, total CAPEX)) or (None, None)
+
+    With a cache.SolutionCache the pair is looked up by a hash of the method,
+    its parameters, the scenario and the planning code, and stored after solving
+    if a plan was found (a failed run may be a time limit or a transient error).
+    """
+    if cache is not None:
+        from cache import method_cache_key
+
+        key = method_cache_key(name, params, scenario)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    with phase(name):
+        loading_plan = get_method(name)(**params)
+    analysis = None
+    if loading_plan is not None:
+        with phase('analysis'):
+            analysis = analyze_loading_plan(loading_plan, scenario)
+
+    if cache is not None and loading_plan is not None:
+        cache.put(key, (loading_plan, analysis))
+    return loading_plan, analysis
+
+def parse_params(values, methods):
+    """Parse METHOD.KEY=VALUE options into keyword arguments for each method"""
+    params = {name: {} for name in methods}
+    for value in values:
+        target, _, raw = value.partition('=')
+        name, _, key = target.partition('.')
+        if not raw or not key or name not in params:
+            raise argparse.ArgumentTypeError(f"Expected METHOD.KEY=VALUE for a selected method, got {value!r}")
+        try:
+            params[name][key] = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            params[name][key] = raw
+    return params
+
+def print_incumbent(plan, objective, elapsed):
+    print(f"Incumbent after {elapsed:.3f}s" + ("" if objective is None else f": objective {objective:,.1f}"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and analyze wafer loading plans")
+    parser.add_argument('methods', nargs='*', metavar='METHOD', help=f"methods to run: {', '.join(METHODS)}")
+    parser.add_argument('-s', '--scenario', metavar='PATH',
+                        help="scenario saved with scenario.save_scenario (.npz file or directory of .npy files)")
+    parser.add_argument('-p', '--param', action='append', default=[], metavar='METHOD.KEY=VALUE',
+                        help="parameter passed to a method, e.g. brute_force.step=50")
+    parser.add_argument('-t', '--trace', metavar='PATH',
+                        help="write phase timings, solver statistics and counters as JSON")
+    parser.add_argument('-c', '--cache', metavar='DIR', default=DEFAULT_CACHE,
+                        help=f"directory of cached plans and analyses (default: {DEFAULT_CACHE})")
+    parser.add_argument('--no-cache', action='store_true', help="always re-solve and do not store results")
+    parser.add_argument('--time-limit', type=float, metavar='SECONDS',
+                        help="time budget per method; the best plan found in time is used (not cached)")
+    parser.add_argument('--gap', type=float, metavar='FRACTION', help="relative MIP gap at which solvers stop")
+    args = parser.parse_args(argv)
+    args.methods = args.methods or DEFAULT_METHODS
+    for name in args.methods:
+        if name not in METHODS:
+            parser.error(f"unknown method {name!r} (choose from {', '.join(METHODS)})")
+
+    try:
+        params = parse_params(args.param, args.methods)
+    except argparse.ArgumentTypeError as exc:
+        parser.error(str(exc))
+
+    scenario = None
+    if args.scenario:
+        from scenario import load_scenario
+        scenario = load_scenario(args.scenario)
+
+    for name in args.methods:
+        if scenario is not None:
+            if 'scenario' not in inspect.signature(get_method(name)).parameters:
+                parser.error(f"method {name!r} does not take a scenario")
+            params[name]['scenario'] = scenario
+
+    cache = None
+    budgeted = args.time_limit is not None or args.gap is not None
+    if not args.no_cache and not budgeted:
+        from cache import SolutionCache
+        cache = SolutionCache(args.cache)
+
+    with tracing('results', args.trace) if args.trace else contextlib.nullcontext():
+        for name in args.methods:
+            if budgeted:
+                from budget import Budget
+                params[name]['budget'] = Budget(args.time_limit, args.gap, print_incumbent)
+            loading_plan, analysis = solve_and_analyze(name, params[name], scenario, cache)
+            print(f'### {METHODS[name][2]} ###')
+            if loading_plan is None:
+                print("No loading plan found\n")
+                continue
+            print_analysis(*analysis)
+            print()
+
+if __name__ == '__main__':
+    main()
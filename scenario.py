@@ -0,0 +1,144 @@
+
+# scenario store
+import json
+import os
+
+import numpy as np
+
+# Arrays stored on disk, one .npy file each (or one entry each in a .npz archive)
+ARRAYS = [
+    'tam',              # quarters, billions of GBs
+    'yields',           # quarters x nodes
+    'gb_per_wafer',     # nodes
+    'initial_loading',  # nodes, weekly wafers in the first quarter
+    'minute_load',      # nodes x workstations, minutes per wafer
+    'utilization',      # workstations
+    'capex_per_tool',   # workstations, millions USD
+    'initial_tools'     # workstations
+]
+
+# Scalars and names stored in meta.json
+SCALARS = {
+    'tam_range': 2.0,  # ±2 billion GBs
+    'contribution_margin_per_gb': 0.002,  # $0.002 per GB
+    'weeks_per_quarter': 13,
+    'max_change': 2500  # Maximum wafer change per node between quarters
+}
+
+class Scenario:
+    """Fab parameters for one planning scenario, held as (possibly memory-mapped) NumPy arrays"""
+
+    def __init__(self, nodes, workstations, **values):
+        self.nodes = list(nodes)
+        self.workstations = list(workstations)
+        for name in ARRAYS:
+            setattr(self, name, values.pop(name))
+        for name, default in SCALARS.items():
+            setattr(self, name, values.pop(name, default))
+        if values:
+            raise TypeError(f"Unknown scenario values: {', '.join(values)}")
+
+        # Derived tables are small (quarters x nodes, workstations) and computed once
+        self.wafer_gb = self.weeks_per_quarter * self.gb_per_wafer * np.asarray(self.yields)
+        self.available_minutes = 7 * 24 * 60 * np.asarray(self.utilization)  # Weekly available minutes
+
+    @property
+    def n_quarters(self):
+        return len(self.tam)
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+def default_scenario():
+    """The competition scenario (8 quarters, 3 nodes, 10 workstations)"""
+    import calculate_profits as cp
+
+    return Scenario(
+        cp.NODES,
+        cp.workstations,
+        tam=cp.tam_base,
+        yields=cp.yield_matrix,
+        gb_per_wafer=cp.gb_per_wafer_vector,
+        initial_loading=np.array([cp.initial_loading[node] for node in cp.NODES]),
+        minute_load=cp.minute_load_matrix,
+        utilization=np.array([cp.utilization[ws] for ws in cp.workstations]),
+        capex_per_tool=cp.capex_vector,
+        initial_tools=cp.initial_tool_vector,
+        tam_range=cp.tam_range,
+        contribution_margin_per_gb=cp.contribution_margin_per_gb,
+        weeks_per_quarter=cp.WEEKS_PER_QUARTER
+    )
+
+def save_scenario(scenario, path):
+    """Save a scenario as a directory of .npy files (memory-mappable) or, for a .npz path, one archive"""
+    meta = {'nodes': scenario.nodes, 'workstations': scenario.workstations}
+    meta.update({name: getattr(scenario, name) for name in SCALARS})
+    arrays = {name: np.asarray(getattr(scenario, name)) for name in ARRAYS}
+
+    if path.endswith('.npz'):
+        np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+        return
+
+    os.makedirs(path, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), values)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+def load_scenario(path, mmap=True):
+    """Load a scenario saved by save_scenario
+
+    Arrays in a directory are memory-mapped read-only by default, so large
+    scenarios are paged in on demand and shared rather than copied.
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as archive:
+            meta = json.loads(str(archive['meta']))
+            arrays = {name: archive[name] for name in ARRAYS}
+    else:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+
+    return Scenario(meta.pop('nodes'), meta.pop('workstations'), **meta, **arrays)
+
+def synthetic_scenario(n_quarters, n_nodes, tam_volatility=0.0, n_workstations=10, seed=0):
+    """Random scenario of the given size
+
+    TAM follows the output of a random walk of loadings that stays within the
+    transition limit, so with tam_volatility=0 a feasible plan always exists;
+    tam_volatility adds relative noise to TAM after the first quarter.
+    """
+    rng = np.random.default_rng(seed)
+    max_change = SCALARS['max_change']
+
+    gb_per_wafer = rng.uniform(80000, 300000, n_nodes)
+    # Yields ramp linearly from a random start towards 0.98
+    ramp_start = rng.uniform(0.2, 0.98, n_nodes)
+    yields = np.minimum(ramp_start + np.arange(n_quarters)[:, None] * rng.uniform(0.02, 0.15, n_nodes), 0.98)
+
+    steps = rng.integers(-max_change // 3, max_change // 2, (n_quarters, n_nodes))
+    steps[0] = rng.integers(1000, 12000, n_nodes)
+    loadings = np.maximum(np.cumsum(steps, axis=0), 0)
+    tam = (loadings * SCALARS['weeks_per_quarter'] * gb_per_wafer * yields).sum(axis=1) / 1e9
+    tam[1:] *= 1 + tam_volatility * rng.standard_normal(n_quarters - 1)
+
+    # Each node uses about half of the workstations
+    minute_load = rng.uniform(1, 16, (n_nodes, n_workstations)) * (rng.random((n_nodes, n_workstations)) < 0.5)
+    utilization = rng.uniform(0.6, 0.85, n_workstations)
+    initial_tools = np.ceil(loadings[0] @ minute_load / (7 * 24 * 60 * utilization)).astype(np.int64)
+
+    return Scenario(
+        [f'Node{i + 1}' for i in range(n_nodes)],
+        [f'W{i + 1}' for i in range(n_workstations)],
+        tam=tam,
+        yields=yields,
+        gb_per_wafer=gb_per_wafer,
+        initial_loading=loadings[0],
+        minute_load=minute_load,
+        utilization=utilization,
+        capex_per_tool=rng.uniform(1.8, 8.0, n_workstations),
+        initial_tools=initial_tools
+    )
@@ -0,0 +1,253 @@
+
+# planning daemon
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from budget import Budget
+from calculate_profits import analyze_loading_plan
+from methods import METHODS, get_method
+from methods import scenarios
+from plans import LoadingPlan
+
+# Requests collected into one batch: at most BATCH_SIZE, waiting at most BATCH_WINDOW seconds for more
+BATCH_SIZE = 16
+BATCH_WINDOW = 0.002
+
+# Keys accepted in a request's "budget" object
+BUDGET_KEYS = ('time_limit', 'mip_gap')
+
+# Solvers that re-solve a warm model for a forecast (see methods.scenarios)
+FORECAST_SOLVERS = {
+    'docplex': scenarios.solve_docplex_scenario,
+    'pulp': scenarios.solve_pulp_scenario
+}
+
+# Scenario loaded by each worker process (None for the competition data)
+worker_scenario = {}
+
+def init_worker(scenario_path=None, threads=1, quiet=True):
+    """Import every backend and build the warm docplex planner once per worker process"""
+    if quiet:
+        # Solver logs would otherwise interleave on the daemon's terminal
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.close(devnull)
+
+    import pulp
+
+    scenarios.init_worker('docplex', threads)
+    scenarios.worker_state['solver'] = pulp.PULP_CBC_CMD(msg=False, threads=threads)
+    for name in METHODS:
+        get_method(name)
+
+    worker_scenario['scenario'] = None
+    if scenario_path is not None:
+        from scenario import load_scenario
+        worker_scenario['scenario'] = load_scenario(scenario_path)
+
+def analysis_json(loading_plan, scenario=None):
+    results, total_capex = analyze_loading_plan(loading_plan, scenario)
+    return {
+        'quarters': [{**result, 'loading': dict(result['loading']), 'tools_needed': dict(result['tools_needed'])}
+                     for result in results],
+        'total_capex': total_capex,
+        'net_profit': sum(result['revenue'] for result in results) / 1e6 - total_capex
+    }
+
+def request_budget(spec, received=None):
+    """Budget for a request's "budget" object, whose time limit counts from `received` (time.time()) if given
+
+    Unknown keys are rejected, so a typo does not silently drop a limit.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Expected a 'budget' object")
+    unknown = sorted(set(spec) - set(BUDGET_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown budget keys: {', '.join(unknown)}")
+    time_limit = spec.get('time_limit')
+    if time_limit is not None and received is not None:
+        # Time spent queued in the daemon and behind earlier requests of the batch counts against the limit
+        time_limit = max(time_limit - (time.time() - received), 0.0)
+    return Budget(time_limit, spec.get('mip_gap'))
+
+def handle_request(request, received=None):
+    """Answer one request in a worker
+
+    {"method": NAME, "params": {...}} runs a registered method on the worker's scenario,
+    within "budget": {"time_limit": SECONDS, "mip_gap": FRACTION} if given, where
+    the time limit counts from `received`, when the daemon got the request;
+    {"forecast": {"tam": ..., "yields": ..., "initial_loading": ...}, "solver": "docplex"}
+    re-solves the warm model with a new forecast (see methods.scenarios.solve_scenarios);
+    {"plan": [{"Node1": ...}, ...]} only analyzes the given plan. The plan is analyzed
+    unless "analyze" is false.
+    """
+    start = time.perf_counter()
+    response = {'id': request.get('id')}
+    scenario = worker_scenario['scenario']
+    try:
+        if 'method' in request:
+            params = dict(request.get('params', {}))
+            if scenario is not None:
+                params['scenario'] = scenario
+            if 'budget' in request:
+                params['budget'] = request_budget(request['budget'], received)
+            loading_plan = get_method(request['method'])(**params)
+        elif 'forecast' in request:
+            solver = request.get('solver', 'docplex')
+            if solver not in FORECAST_SOLVERS:
+                raise ValueError(f"Unknown solver: {solver}")
+            # Forecasts are always for the competition nodes
+            scenario = None
+            loading_plan, response['status'], response['objective'] = FORECAST_SOLVERS[solver](request['forecast'])
+        elif 'plan' in request:
+            loading_plan = LoadingPlan.from_dicts(request['plan'])
+        else:
+            raise ValueError("Expected a 'method', 'forecast' or 'plan' request")
+
+        response['plan'] = None if loading_plan is None else LoadingPlan.from_dicts(loading_plan).to_dicts()
+        if loading_plan is not None and request.get('analyze', True):
+            response['analysis'] = analysis_json(loading_plan, scenario)
+    except Exception as exc:
+        response['error'] = repr(exc)
+    response['time'] = time.perf_counter() - start
+    return response
+
+def handle_batch(requests):
+    """Answer (request, received time) pairs in order"""
+    return [handle_request(request, received) for request, received in requests]
+
+class PlanningServer:
+    """asyncio server answering newline-delimited JSON requests from warm worker processes
+
+    Requests arriving together are grouped into batches of up to batch_size,
+    and at most `workers` batches run at once, one per worker process.
+    """
+
+    def __init__(self, workers=2, scenario_path=None, threads=1, batch_size=BATCH_SIZE, batch_window=BATCH_WINDOW,
+                 quiet=True):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(scenario_path, threads, quiet))
+        self.queue = None
+        self.slots = None
+
+    def warm_up(self):
+        """Start every worker (imports and model builds) before the first request"""
+        for future in [self.pool.submit(handle_batch, []) for _ in range(self.workers)]:
+            future.result()
+
+    async def submit(self, request):
+        future = asyncio.get_running_loop().create_future()
+        # Wall-clock arrival time, comparable in the worker processes
+        await self.queue.put((request, future, time.time()))
+        return await future
+
+    async def dispatch(self):
+        """Group queued requests into batches and run them on the pool"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self.slots.acquire()
+            requests = [(request, received) for request, _, received in batch]
+            task = loop.run_in_executor(self.pool, handle_batch, requests)
+            task.add_done_callback(lambda task, batch=batch: self.finish(task, batch))
+
+    def finish(self, task, batch):
+        self.slots.release()
+        # task.exception() raises CancelledError on a cancelled task (e.g. the pool shutting down)
+        if task.cancelled():
+            responses = [{'id': request.get('id'), 'error': "Request cancelled"} for request, _, _ in batch]
+        elif task.exception() is not None:
+            responses = [{'id': request.get('id'), 'error': repr(task.exception())} for request, _, _ in batch]
+        else:
+            responses = task.result()
+        for (_, future, _), response in zip(batch, responses):
+            if not future.done():
+                future.set_result(response)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    response = {'error': f"Invalid JSON: {exc}"}
+                else:
+                    if not isinstance(request, dict):
+                        request = {'invalid': request}
+                    response = await self.submit(request)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, path=None, host='127.0.0.1', port=8765):
+        """Listen on a Unix socket at `path`, or on host:port, until cancelled"""
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.workers)
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        dispatcher = asyncio.create_task(self.dispatch())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            dispatcher.cancel()
+            self.pool.shutdown(cancel_futures=True)
+
+def query(request, path=None, host='127.0.0.1', port=8765):
+    """Send one request to a running server and return its response"""
+    if path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection((host, port))
+    with connection, connection.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode() + b'\n')
+        stream.flush()
+        return json.loads(stream.readline())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve loading plans and analyses from warm solver processes")
+    parser.add_argument('--socket', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-w', '--workers', type=int, default=2, help="worker processes (batches solved at once)")
+    parser.add_argument('--threads', type=int, default=1, help="solver threads per worker")
+    parser.add_argument('-s', '--scenario', metavar='PATH', help="scenario used for method requests")
+    parser.add_argument('--verbose', action='store_true', help="show solver logs")
+    parser.add_argument('--query', metavar='JSON', help="send one request to a running server and print the response")
+    args = parser.parse_args(argv)
+
+    if args.query:
+        print(json.dumps(query(json.loads(args.query), args.socket, args.host, args.port), indent=2))
+        return
+
+    server = PlanningServer(args.workers, args.scenario, args.threads, quiet=not args.verbose)
+    server.warm_up()
+    print(f"Serving on {args.socket or f'{args.host}:{args.port}'} with {args.workers} workers")
+    try:
+        asyncio.run(server.serve(args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
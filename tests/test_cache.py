@@ -0,0 +1,48 @@
+import os
+import time
+
+from cache import SolutionCache, cache_key, method_cache_key
+from results import solve_and_analyze
+from scenario import default_scenario, synthetic_scenario
+
+def test_key_changes_with_params_scenario_and_code():
+    key = cache_key('naive', {'step': 100})
+
+    assert key == cache_key('naive', {'step': 100}, default_scenario())
+    assert key != cache_key('naive', {'step': 200})
+    assert key != cache_key('naive', {'step': 100}, synthetic_scenario(8, 3))
+    assert key != cache_key('naive', {'step': 100}, code='edited')
+
+def test_round_trip_and_unreadable_entry(tmp_path):
+    cache = SolutionCache(str(tmp_path))
+    cache.put('plan', {'value': 1})
+    assert cache.get('plan') == {'value': 1}
+
+    with open(cache.entry_path('broken'), 'wb') as f:
+        f.write(b'not a pickle')
+    assert cache.get('broken', 'missing') == 'missing'
+    assert not os.path.exists(cache.entry_path('broken'))
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = SolutionCache(str(tmp_path), max_bytes=3000)
+    for key in ('a', 'b'):
+        cache.put(key, b'x' * 1000)
+    # Reading 'a' makes 'b' the least recently used entry
+    past = time.time() - 10
+    os.utime(cache.entry_path('b'), (past, past))
+    os.utime(cache.entry_path('a'), (past - 10, past - 10))
+    cache.get('a')
+    cache.put('c', b'x' * 1000)
+
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.get('b') is None
+
+def test_solve_and_analyze_reuses_the_cached_plan(tmp_path):
+    cache = SolutionCache(str(tmp_path))
+    key = method_cache_key('naive', {})
+    loading_plan, analysis = solve_and_analyze('naive', {}, cache=cache)
+    assert cache.get(key) == (loading_plan, analysis)
+
+    # A hit returns the stored entry without solving
+    cache.put(key, ('cached plan', 'cached analysis'))
+    assert solve_and_analyze('naive', {}, cache=cache) == ('cached plan', 'cached analysis')
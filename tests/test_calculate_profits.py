@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from calculate_profits import NODES, analyze_loading_plan, analyze_loading_plans
+from methods.naive import get_naive_loading_plan
+from scenario import synthetic_scenario
+
+def test_batch_matches_one_plan_at_a_time():
+    base = np.asarray(get_naive_loading_plan())
+    plans = base[None] + np.random.default_rng(0).integers(-300, 300, (5, *base.shape))
+    batch = analyze_loading_plans(plans)
+
+    for i, plan in enumerate(plans):
+        results, total_capex = analyze_loading_plan([dict(zip(NODES, row)) for row in plan])
+        assert batch['total_capex'][i] == pytest.approx(total_capex)
+        assert batch['output'][i] == pytest.approx([result['output'] for result in results])
+        assert batch['net_profit'][i] == pytest.approx(sum(r['revenue'] for r in results) / 1e6 - total_capex)
+
+def test_scenario_tables_are_used():
+    scenario = synthetic_scenario(4, 2, seed=2)
+    loadings = np.full((1, 4, 2), 1000)
+    analysis = analyze_loading_plans(loadings, scenario)
+
+    assert analysis['tools_needed'].shape == (1, 4, len(scenario.workstations))
+    assert analysis['output'][0] == pytest.approx(1000 * np.asarray(scenario.wafer_gb).sum(axis=1) / 1e9)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from methods import dynamic_programming
+from methods.brute_force import get_brute_force_loading_plan, reachable_bounds
+from methods.dynamic_programming import change_costs, find_optimal_loading, lattice_states
+
+def total_change(loading_plan):
+    return np.abs(np.diff(np.asarray(loading_plan), axis=0)).sum()
+
+def test_change_optimum_is_no_worse_than_brute_force():
+    loading_plan, best_change = find_optimal_loading(step=500)
+    greedy = get_brute_force_loading_plan(step=500)
+
+    assert total_change(loading_plan) == best_change
+    assert best_change <= total_change(greedy)
+
+def test_slabs_match_the_dense_transform(monkeypatch):
+    step = 250
+    bounds = reachable_bounds()
+    prev_states, states = lattice_states(3, step, bounds), lattice_states(4, step, bounds)
+    prev_cost = np.random.default_rng(0).integers(0, 10000, len(prev_states)).astype(float)
+    dense = change_costs(prev_states, prev_cost, states, step)
+
+    monkeypatch.setattr(dynamic_programming, 'MAX_GRID_CELLS', 20_000)
+    assert np.array_equal(change_costs(prev_states, prev_cost, states, step), dense)
+
+def test_too_fine_step_fails_before_the_forward_pass():
+    with pytest.raises(ValueError, match="coarser step"):
+        find_optimal_loading(step=100, objective='profit')
@@ -0,0 +1,22 @@
+import pytest
+
+from methods.frontier import non_dominated, pareto_frontier
+
+def point(total_change, capex, revenue):
+    return {'total_change': total_change, 'capex': capex, 'revenue': revenue}
+
+def test_non_dominated_keeps_trade_offs():
+    stable, costly, dominated, profitable = point(100, 10, 50), point(100, 12, 50), point(300, 10, 40), point(300, 20, 90)
+
+    assert non_dominated([stable, costly, dominated, profitable]) == [stable, profitable]
+
+def test_frontier_trades_change_for_profit():
+    points = pareto_frontier(n_points=3)
+
+    assert len(points) >= 2
+    for lower, higher in zip(points, points[1:]):
+        assert lower['total_change'] < higher['total_change']
+        assert lower['net_profit'] < higher['net_profit']
+    for entry in points:
+        assert entry['total_change'] <= entry['epsilon'] + 1e-6
+        assert entry['net_profit'] == pytest.approx(entry['revenue'] - entry['capex'])
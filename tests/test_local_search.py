@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from calculate_profits import analyze_loading_plans, tam_base, tam_range
+from methods.local_search import PlanState, improve_plan
+from methods.naive import get_naive_loading_plan
+
+def test_move_delta_matches_a_full_analysis():
+    state = PlanState(get_naive_loading_plan())
+    rng = np.random.default_rng(0)
+    checked = 0
+    while checked < 50:
+        quarter, node, change = int(rng.integers(1, 8)), int(rng.integers(0, 3)), int(rng.integers(-400, 400))
+        move = state.evaluate(quarter, node, change)
+        if move is None:
+            continue
+        before = state.profit
+        state.apply(quarter, node, change, *move)
+        full = float(analyze_loading_plans(state.loadings[None])['net_profit'][0])
+        assert state.profit - before == pytest.approx(move[0], abs=1e-6)
+        assert state.profit == pytest.approx(full, abs=1e-6)
+        checked += 1
+
+def test_improved_plan_is_feasible_and_no_worse():
+    start = get_naive_loading_plan()
+    start_profit = float(analyze_loading_plans(np.asarray(start)[None])['net_profit'][0])
+    loading_plan, profit = improve_plan(start, n_moves=20_000, seed=1)
+
+    analysis = analyze_loading_plans(loading_plan.array[None])
+    assert profit == pytest.approx(float(analysis['net_profit'][0]))
+    assert profit >= start_profit
+    assert np.array_equal(loading_plan.array[0], np.asarray(start)[0])
+    assert np.all(np.abs(np.diff(loading_plan.array, axis=0)) <= 2500)
+    assert np.all(loading_plan.array >= 0)
+    assert np.all(np.abs(analysis['output'][0, 1:] - tam_base[1:]) <= tam_range + 1e-9)
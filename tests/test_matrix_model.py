@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from docplex.mp.model import Model
+
+from methods import docplex_barrier
+from methods.matrix_model import BACKENDS, build_wafer_change_model, plan_from_solution, synthetic_instance
+
+def instance():
+    return synthetic_instance(n_quarters=6, n_nodes=3, seed=1)
+
+def test_backends_agree_on_a_feasible_optimum():
+    tam, quarter_wafer_gb, start_loading = instance()
+    model = build_wafer_change_model(tam, quarter_wafer_gb, start_loading)
+
+    objectives = {}
+    for backend, solve in BACKENDS.items():
+        values = solve(model)
+        activity = model['A'] @ values
+        assert np.all(activity >= model['row_lb'] - 1e-6) and np.all(activity <= model['row_ub'] + 1e-6)
+        objectives[backend] = model['c'] @ values
+
+        loadings = plan_from_solution(model, values, ['a', 'b', 'c']).array
+        assert np.array_equal(loadings[0], start_loading)
+        assert np.all(np.abs(np.diff(loadings, axis=0)) <= 2500)
+        assert np.all(np.abs((loadings * quarter_wafer_gb).sum(axis=1) / 1e9 - tam) <= 2 + 1e-6)
+    assert objectives['pulp'] == pytest.approx(objectives['highs'])
+    assert objectives['cplex'] == pytest.approx(objectives['highs'])
+
+def test_same_optimum_as_the_docplex_builder():
+    tam, quarter_wafer_gb, start_loading = instance()
+    model = build_wafer_change_model(tam, quarter_wafer_gb, start_loading)
+    values = BACKENDS['highs'](model)
+
+    # One GB per wafer and yields of quarter_wafer_gb / 13 give the same production coefficients
+    nodes = range(quarter_wafer_gb.shape[1])
+    solution, _ = docplex_barrier.solve(Model(), tam=list(tam),
+                                        yields={n: list(quarter_wafer_gb[:, n] / 13) for n in nodes},
+                                        start_loading={n: start_loading[n] for n in nodes},
+                                        gb_per_wafer={n: 1 for n in nodes}, log_output=False)
+    assert solution.objective_value == pytest.approx(model['c'] @ values)
@@ -0,0 +1,27 @@
+import numpy as np
+
+from plans import LoadingPlan
+
+def plan():
+    return LoadingPlan.from_dicts([{'Node1': 12000, 'Node2': 5000}, {'Node1': 11000, 'Node2': 6000}])
+
+def test_array_copy_is_independent_of_the_plan():
+    loading_plan = plan()
+    copied = np.array(loading_plan, copy=True)
+    copied[0, 0] = 0
+
+    assert loading_plan[0]['Node1'] == 12000
+
+def test_asarray_shares_the_plan():
+    loading_plan = plan()
+    np.asarray(loading_plan)[1, 1] = 0
+
+    assert loading_plan[1]['Node2'] == 0
+
+def test_dtype_conversion_copies():
+    loading_plan = plan()
+    converted = np.asarray(loading_plan, dtype=float)
+    converted[0, 1] = 0.5
+
+    assert converted.dtype == float
+    assert loading_plan[0]['Node2'] == 5000
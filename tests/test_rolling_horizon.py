@@ -0,0 +1,45 @@
+import numpy as np
+
+from methods.matrix_model import get_matrix_model_loading_plan
+from methods.rolling_horizon import remaining_scenario, replan
+from scenario import default_scenario
+
+COMPLETED = 3
+
+def replan_from_actuals(actual_yields=None):
+    scenario = default_scenario()
+    plan = get_matrix_model_loading_plan(scenario=scenario)
+    actual = plan.array[:COMPLETED]
+    return scenario, actual, replan(plan, actual, actual_yields, scenario, backend='highs')
+
+def assert_feasible(scenario, actual, new_plan, actual_yields=None):
+    remaining = remaining_scenario(scenario, actual, actual_yields)
+    rows = new_plan.array[COMPLETED - 1:]
+    output = (rows * remaining.wafer_gb).sum(axis=1) / 1e9
+    assert np.all(np.abs(output[1:] - remaining.tam[1:]) <= remaining.tam_range + 1e-6)
+    assert np.all(np.abs(np.diff(new_plan.array, axis=0)) <= scenario.max_change)
+
+def test_replan_keeps_completed_quarters_and_is_feasible():
+    scenario, actual, new_plan = replan_from_actuals()
+
+    assert new_plan.nodes == scenario.nodes
+    assert np.array_equal(new_plan.array[:COMPLETED], actual)
+    assert len(new_plan) == scenario.n_quarters
+    assert_feasible(scenario, actual, new_plan)
+
+def test_actual_yields_rescale_the_remaining_forecast():
+    scenario = default_scenario()
+    actual_yields = np.array(scenario.yields[:COMPLETED], dtype=float)
+    actual_yields[-1, 2] *= 0.8
+    forecast = np.asarray(scenario.yields)
+    remaining = remaining_scenario(scenario, get_matrix_model_loading_plan(scenario=scenario).array[:COMPLETED],
+                                   actual_yields)
+
+    assert np.allclose(remaining.yields[1:, 2], np.minimum(forecast[COMPLETED:, 2] * 0.8, 1.0))
+    assert np.allclose(remaining.yields[1:, :2], forecast[COMPLETED:, :2])
+
+    scenario, actual, base = replan_from_actuals()
+    _, _, behind = replan_from_actuals(actual_yields)
+    assert np.array_equal(behind.array[:COMPLETED], actual)
+    assert_feasible(scenario, actual, behind, actual_yields)
+    assert not np.array_equal(behind.array[COMPLETED:], base.array[COMPLETED:])
@@ -0,0 +1,29 @@
+import os
+import signal
+
+from calculate_profits import initial_loading, tam_base, yields
+from methods.scenarios import solve_scenarios
+
+TAM = tam_base.tolist()
+
+class KillWorker(list):
+    """TAM forecast that kills the worker process reading it"""
+
+    def __getitem__(self, index):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+def scenario(name, tam=TAM):
+    return {'name': name, 'tam': tam, 'yields': yields, 'initial_loading': initial_loading}
+
+def test_killed_worker_fails_only_its_scenario():
+    scenarios = [scenario(f'base{i}', [value + 0.1 * i for value in TAM]) for i in range(6)]
+    scenarios[2] = scenario('crash', KillWorker(TAM))
+
+    results = {result['index']: result for result in solve_scenarios(scenarios, method='pulp', max_workers=2)}
+
+    assert sorted(results) == list(range(6))
+    assert results[2]['status'] == 'error'
+    assert 'BrokenProcessPool' in results[2]['error']
+    for index in (0, 1, 3, 4, 5):
+        assert results[index]['status'] == 'Optimal'
+        assert results[index]['plan'] is not None
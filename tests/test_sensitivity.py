@@ -0,0 +1,32 @@
+import pulp
+import pytest
+
+from methods.pulp_simplex import TAM, get_pulp_simplex_loading_plan, sensitivity, solve
+from methods.sensitivity import pulp_what_if
+
+def allowed_increase(what_if, row):
+    return what_if.rhs_ranges[row][1] - what_if.rhs[row]
+
+def test_dual_prediction_matches_a_resolve_for_a_tam_change():
+    what_if = pulp_what_if()
+    # Half of the allowed increase of a binding production row, in billions of GB
+    quarter = next(q for q, (row,) in what_if.production.items()
+                   if abs(what_if.shadow_prices[row]) > 1e-9 and 0 < allowed_increase(what_if, row) < float('inf'))
+    change = allowed_increase(what_if, what_if.production[quarter][0]) / 2 / 1e9
+
+    predicted = what_if.what_if(tam={quarter: change})
+    assert predicted['method'] == 'dual' and predicted['exact']
+
+    prob = pulp.LpProblem("Minimize_Wafer_Change", pulp.LpMinimize)
+    solve(prob, tam={**TAM, quarter: TAM[quarter] + change * 1e9}, solver=pulp.PULP_CBC_CMD(msg=False))
+    assert predicted['objective'] == pytest.approx(pulp.value(prob.objective), rel=1e-6)
+    assert what_if.what_if(tam={quarter: change}, resolve=True)['objective'] == pytest.approx(predicted['objective'],
+                                                                                              rel=1e-6)
+
+def test_public_path_returns_the_solved_lp():
+    loading_plan, prob = get_pulp_simplex_loading_plan(return_model=True)
+    report = sensitivity(prob)
+
+    assert loading_plan is not None
+    assert report['objective'] == pytest.approx(pulp_what_if().objective, rel=1e-6)
+    assert set(report['shadow_prices']) >= {f"Production_Q{q}" for q in range(2, len(TAM) + 1)}
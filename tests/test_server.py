@@ -0,0 +1,54 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import server
+from calculate_profits import initial_loading
+
+def test_budget_counts_from_the_request_arrival():
+    budget = server.request_budget({'time_limit': 10, 'mip_gap': 0.01}, received=time.time() - 4)
+
+    assert budget.mip_gap == 0.01
+    assert 5 < budget.remaining() <= 6
+    with pytest.raises(ValueError, match="Unknown budget keys: timeout"):
+        server.request_budget({'timeout': 10})
+
+def test_requests_are_answered_in_order(monkeypatch):
+    monkeypatch.setitem(server.worker_scenario, 'scenario', None)
+    plan = [dict(initial_loading)] * 8
+    responses = server.handle_batch([
+        ({'id': 1, 'method': 'naive', 'budget': {'time_limit': 30}}, time.time()),
+        ({'id': 2, 'plan': plan}, None),
+        ({'id': 3, 'method': 'naive', 'budget': {'limit': 1}}, None),
+        ({'id': 4}, None)
+    ])
+
+    assert [response['id'] for response in responses] == [1, 2, 3, 4]
+    assert responses[0]['plan'] is not None and 'analysis' in responses[0]
+    assert responses[1]['plan'] == plan
+    assert 'Unknown budget keys' in responses[2]['error']
+    assert 'Expected a' in responses[3]['error']
+
+def test_daemon_answers_over_a_socket(tmp_path):
+    path = str(tmp_path / 'planner.sock')
+    planning_server = server.PlanningServer(workers=1)
+
+    async def exchange():
+        serving = asyncio.create_task(planning_server.serve(path))
+        while not (tmp_path / 'planner.sock').exists():
+            await asyncio.sleep(0.05)
+        reader, writer = await asyncio.open_unix_connection(path)
+        responses = []
+        for line in (json.dumps({'id': 'a', 'method': 'naive', 'analyze': False}), 'not json'):
+            writer.write(line.encode() + b'\n')
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        serving.cancel()
+        return responses
+
+    planned, invalid = asyncio.run(exchange())
+    assert planned['id'] == 'a' and len(planned['plan']) == 8 and 'analysis' not in planned
+    assert invalid['error'].startswith('Invalid JSON')